@@ -0,0 +1,175 @@
+"""
+Benchmark SFTP listing and small-read throughput under simulated network latency
+
+Runs an SFTP server in-process over a directory of generated JP2 headers, behind a proxy
+that delays every chunk of traffic in each direction, then lists the directory and reads
+image headers through SSHConnection with each transport profile.
+
+    python benchmarks/sftp_latency.py --latency 0.025 --files 5000 --reads 100
+"""
+import argparse
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import paramiko
+
+from manifester.ssh_connection import SSHConnection, TransportProfile, transport_profiles
+
+
+def jp2(width: int, height: int) -> bytes:
+    signature = struct.pack('>I4s4s', 12, b'jP  ', b'\r\n\x87\n')
+    ftyp = struct.pack('>I4s4sI4s', 20, b'ftyp', b'jp2 ', 0, b'jp2 ')
+    ihdr = struct.pack('>I4sIIHBBBB', 22, b'ihdr', height, width, 3, 7, 7, 0, 0)
+    jp2h = struct.pack('>I4s', 8 + len(ihdr), b'jp2h') + ihdr
+    # Stand-in codestream, so the header is followed by data as in a real image.
+    jp2c = struct.pack('>I4s', 8 + 16384, b'jp2c') + bytes(16384)
+    return signature + ftyp + jp2h + jp2c
+
+
+class Server(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+class Handle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+class SFTPServer(paramiko.SFTPServerInterface):
+    def list_folder(self, path):
+        try:
+            return [paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(path, name)), name)
+                    for name in os.listdir(path)]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        try:
+            handle = Handle(flags)
+            handle.readfile = open(path, 'rb')
+            handle.filename = path
+            return handle
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, path, attr):
+        os.chmod(path, attr.st_mode)
+        return paramiko.SFTP_OK
+
+
+def serve(listener: socket.socket, host_key: paramiko.PKey) -> None:
+    while True:
+        client, _ = listener.accept()
+        transport = paramiko.Transport(client)
+        transport.add_server_key(host_key)
+        transport.set_subsystem_handler('sftp', paramiko.SFTPServer, SFTPServer)
+        transport.start_server(server=Server())
+
+
+def delay_proxy(listener: socket.socket, target: tuple, latency: float) -> None:
+    """
+    Forward connections to the target, holding every chunk for `latency` seconds each way
+    """
+    def pipe(source: socket.socket, destination: socket.socket) -> None:
+        chunks = queue.Queue()
+
+        def send() -> None:
+            while True:
+                due, data = chunks.get()
+                time.sleep(max(0.0, due - time.monotonic()))
+                if not data:
+                    destination.close()
+                    return
+                destination.sendall(data)
+
+        threading.Thread(target=send, daemon=True).start()
+        while True:
+            try:
+                data = source.recv(65536)
+            except OSError:
+                data = b''
+            chunks.put((time.monotonic() + latency, data))
+            if not data:
+                return
+
+    while True:
+        client, _ = listener.accept()
+        upstream = socket.create_connection(target)
+        for source, destination in ((client, upstream), (upstream, client)):
+            destination.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=pipe, args=(source, destination), daemon=True).start()
+
+
+def listener() -> socket.socket:
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen()
+    return sock
+
+
+def benchmark(name: str, profile: TransportProfile, port: int, image_dir: str, reads: int) -> None:
+    connection = SSHConnection('bench@127.0.0.1', image_dir, profile, read_headers=True,
+                               connect_options={'port': port, 'password': 'bench', 'allow_agent': False,
+                                                'look_for_keys': False})
+    start = time.perf_counter()
+    connection.refresh()
+    listed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for filename in sorted(connection.files)[:reads]:
+        assert connection.dimensions(filename) == (600, 800)
+    read = time.perf_counter() - start
+    connection.close()
+
+    print(f'{name:<10} listing {len(connection.files)} files: {listed:.2f}s '
+          f'({len(connection.files) / listed:.0f} files/s); '
+          f'{reads} header reads: {read:.2f}s ({reads / read:.1f} reads/s)')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.025, help='one-way delay in seconds')
+    parser.add_argument('--files', type=int, default=5000, help='image files in the directory')
+    parser.add_argument('--reads', type=int, default=100, help='image headers to read')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as image_dir:
+        header = jp2(600, 800)
+        for counter in range(1, args.files + 1):
+            with open(os.path.join(image_dir, f'bench_{counter:04d}.jp2'), 'wb') as fh:
+                fh.write(header)
+
+        server = listener()
+        proxy = listener()
+        threading.Thread(target=serve, args=(server, paramiko.RSAKey.generate(2048)), daemon=True).start()
+        threading.Thread(target=delay_proxy, args=(proxy, server.getsockname(), args.latency), daemon=True).start()
+        port = proxy.getsockname()[1]
+
+        print(f'Round trip {args.latency * 2 * 1000:.0f}ms')
+        benchmark('unpipelined', TransportProfile(read_aheads=1), port, image_dir, args.reads)
+        for name, profile in transport_profiles.items():
+            benchmark(name, profile, port, image_dir, args.reads)
+
+
+if __name__ == '__main__':
+    main()
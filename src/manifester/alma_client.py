@@ -0,0 +1,113 @@
+import logging
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+import urllib3
+
+from manifester.alma_record import AlmaRecord
+from manifester.errors import AlmaAPIError
+from manifester.marcxml import local_name, record_from_element
+from manifester.metrics import metrics
+
+api_base = 'https://api-na.hosted.exlibrisgroup.com/almaws/v1'
+
+# The Bibs API accepts at most 100 MMS IDs per request.
+batch_size = 100
+
+# Connection pools, by the number of requests they serve at once. These stay warm between
+# fetches in a long-running process.
+_pools: dict = {}
+
+
+def fetch_bibs(mms_ids: Iterable[str], api_key: str, base: str = api_base, concurrency: int = 4,
+               identifier: Optional[str] = None) -> Iterator[AlmaRecord]:
+    """
+    Fetch bib records from the Alma Bibs API
+
+    IDs are requested in batches of up to 100, with up to `concurrency` batches in flight.
+    Records are yielded in the order of the IDs' batches.
+
+    :param mms_ids: Iterable[str] the MMS IDs
+    :param api_key: str Alma API key
+    :param base: str API base URL
+    :param concurrency: int maximum number of requests in flight
+    :param identifier: Optional[str] the records' identifier; if None, the MMS will be used
+    :return: Iterator[AlmaRecord] the records
+    """
+    http = _pool(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = deque()
+        for batch in _batches(mms_ids):
+            if len(in_flight) >= concurrency:
+                yield from in_flight.popleft().result()
+            in_flight.append(executor.submit(_fetch_batch, http, batch, api_key, base, identifier))
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def read_mms_ids(mms_file: str) -> Iterator[str]:
+    """
+    Read MMS IDs from a file, one per line or comma-separated
+
+    :param mms_file: str path to the file
+    :return: Iterator[str] the IDs
+    """
+    with open(mms_file) as fh:
+        for line in fh:
+            for mms_id in line.split(','):
+                if mms_id.strip():
+                    yield mms_id.strip()
+
+
+def _pool(size: int) -> urllib3.PoolManager:
+    if size not in _pools:
+        _pools[size] = urllib3.PoolManager(maxsize=size)
+    return _pools[size]
+
+
+def _fetch_batch(http: urllib3.PoolManager, batch: list[str], api_key: str, base: str,
+                 identifier: Optional[str]) -> list[AlmaRecord]:
+    url = f'{base.rstrip("/")}/bibs'
+    fields = {'mms_id': ','.join(batch), 'view': 'full', 'expand': 'None'}
+    # Sent as a header, so the key stays out of proxy and server access logs.
+    headers = {'Accept': 'application/xml', 'Authorization': f'apikey {api_key}'}
+    logging.info(f'Fetching {len(batch)} bibs from {url}')
+    with metrics.timer('alma_bibs', histogram='alma_bibs_seconds'):
+        response = http.request('GET', url, fields=fields, headers=headers, preload_content=False)
+        try:
+            if response.status != 200:
+                raise AlmaAPIError(f'Alma API returned {response.status}: {response.data.decode("utf-8", "replace")}')
+            records = list(_parse_bibs(response, identifier))
+        finally:
+            response.release_conn()
+    metrics.increment('http_requests')
+    metrics.increment('alma_records', len(records))
+    if len(records) < len(batch):
+        logging.warning(f'Alma returned {len(records)} of {len(batch)} requested bibs')
+    return records
+
+
+def _parse_bibs(stream, identifier: Optional[str]) -> Iterator[AlmaRecord]:
+    """
+    Stream <record> elements out of a <bibs> response
+    """
+    for event, element in ET.iterparse(stream, events=('end',)):
+        name = local_name(element.tag)
+        if name == 'record':
+            yield AlmaRecord(record_from_element(element), identifier=identifier)
+            element.clear()
+        elif name == 'bib':
+            element.clear()
+
+
+def _batches(mms_ids: Iterable[str]) -> Iterator[list[str]]:
+    batch = []
+    for mms_id in mms_ids:
+        batch.append(mms_id)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
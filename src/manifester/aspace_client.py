@@ -1,21 +1,72 @@
+import getpass
+import time
 from typing import Optional
 
 import requests
 
+from manifester.metrics import metrics
+
 api_base = 'https://cassandra.bc.edu/api'
 
+# Pooled HTTP session, login token and looked-up records. These stay warm between lookups
+# in a long-running process. Records are kept with the time they were fetched.
+http_session = requests.Session()
+_aspace_session: Optional[str] = None
+_records: dict = {}
+
+
+def lookup(aspace_url: str, user: str, password: Optional[str], max_age: Optional[float] = None):
+    """
+    Look up an ASpace record, reusing one looked up recently
+
+    :param aspace_url: str the record's URL path (e.g. /repositories/2/archival_objects/142452)
+    :param user: str the ASpace user
+    :param password: Optional[str] the password; asked for if not given
+    :param max_age: Optional[float] seconds a looked-up record is reused for; forever if None
+    :return: the record
+    """
+    global _aspace_session
+
+    if aspace_url in _records:
+        fetched, record = _records[aspace_url]
+        if max_age is None or time.monotonic() - fetched <= max_age:
+            metrics.increment('aspace_cache_hits')
+            return record
 
-def lookup(aspace_url: str, user: str, password: Optional[str]):
     # Authorize
+    if not _aspace_session:
+        _aspace_session = _login(user, password)
+
+    # Lookup the record, logging in again if the session has expired.
+    lookup_response = _get(aspace_url)
+    if lookup_response.status_code in (403, 412):
+        _aspace_session = _login(user, password)
+        lookup_response = _get(aspace_url)
+    lookup_data = lookup_response.json()
+    _records[aspace_url] = (time.monotonic(), lookup_data)
+    return lookup_data
+
+
+def clear_cache() -> None:
+    """
+    Forget looked-up records so the next lookup fetches fresh data
+    """
+    _records.clear()
+
+
+def _login(user: str, password: Optional[str]) -> str:
     if not password:
         password = getpass.getpass(f'ASpace password for {user}:')
     auth_url = f'{api_base}/users/{user}/login'
-    with requests.post(auth_url, data={'password': password}) as auth_response:
+    with http_session.post(auth_url, data={'password': password}) as auth_response:
         auth_data = auth_response.json()
-        session = auth_data['session']
+    metrics.increment('http_requests')
+    return auth_data['session']
+
 
-    # Lookup the record
+def _get(aspace_url: str) -> requests.Response:
     lookup_url = f'{api_base}{aspace_url}'
-    with requests.get(lookup_url, headers={'X-ArchivesSpace-Session': session}) as lookup_response:
-        lookup_data = lookup_response.json()
-    return lookup_data
+    with metrics.timer('aspace_lookup', histogram='aspace_lookup_seconds'):
+        response = http_session.get(lookup_url, headers={'X-ArchivesSpace-Session': _aspace_session})
+    metrics.increment('http_requests')
+    return response
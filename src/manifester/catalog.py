@@ -0,0 +1,186 @@
+"""
+Local catalog of the manifests manifester has built
+"""
+import json
+import sqlite3
+import threading
+from typing import Optional
+
+from manifester.source_record import SourceRecord
+
+# Catalog columns, in table order.
+columns = [
+    'identifier',
+    'title',
+    'handle_url',
+    'first_canvas',
+    'manifest_path',
+    'view_path',
+    'handle_path',
+    'manifest_url',
+    'view_url',
+    'source_type',
+    'canvas_count',
+    'image_base',
+    'content_hash',
+    'image_stamps',
+    'built_at'
+]
+
+schema = '''
+CREATE TABLE IF NOT EXISTS manifests (
+    identifier TEXT PRIMARY KEY,
+    title TEXT,
+    handle_url TEXT,
+    first_canvas TEXT,
+    manifest_path TEXT,
+    view_path TEXT,
+    handle_path TEXT,
+    manifest_url TEXT,
+    view_url TEXT,
+    source_type TEXT,
+    canvas_count INTEGER,
+    image_base TEXT,
+    content_hash TEXT,
+    image_stamps TEXT,
+    built_at TEXT
+);
+CREATE INDEX IF NOT EXISTS manifests_image_base ON manifests (image_base);
+'''
+
+
+class CatalogEntry(SourceRecord):
+    """
+    A catalogued manifest
+
+    Has everything needed to rebuild the view and handle files without the original source
+    record.
+    """
+    def __init__(self, row: dict):
+        self.row = row
+
+    @property
+    def identifier(self) -> str:
+        return self.row['identifier']
+
+    @property
+    def title(self) -> str:
+        return self.row['title']
+
+    @property
+    def publication_year(self) -> str:
+        return ''
+
+    @property
+    def handle_url(self) -> str:
+        return self.row['handle_url']
+
+    @property
+    def manifest_url(self) -> str:
+        return self.row['manifest_url']
+
+    @property
+    def view_url(self) -> str:
+        return self.row['view_url']
+
+    @property
+    def image_stamps(self) -> dict[str, tuple[float, int]]:
+        # The (mtime, size) of each image file when the manifest was built.
+        stamps = json.loads(self.row['image_stamps']) if self.row['image_stamps'] else {}
+        return {filename: tuple(stamp) for filename, stamp in stamps.items()}
+
+    def __getattr__(self, name: str):
+        if name in columns:
+            return self.row[name]
+        raise AttributeError(name)
+
+
+class Catalog:
+    """
+    SQLite catalog with one row per identifier
+    """
+    filename: str
+
+    def __init__(self, filename: str):
+        """
+        Constructor
+
+        :param filename: str the SQLite database file; created if it doesn't exist
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(schema)
+
+    def record(self, entry: dict) -> None:
+        """
+        Add or replace a manifest's row
+
+        :param entry: dict values for every column
+        """
+        placeholders = ', '.join('?' for _ in columns)
+        with self._lock, self._db:
+            self._db.execute(f'INSERT OR REPLACE INTO manifests ({", ".join(columns)}) VALUES ({placeholders})',
+                             [entry.get(column) for column in columns])
+
+    def update(self, identifier: str, values: dict) -> None:
+        """
+        Change some of a manifest's columns
+
+        :param identifier: str the manifest's identifier
+        :param values: dict new values by column
+        """
+        for column in values:
+            if column not in columns:
+                raise ValueError(f'Unknown catalog column {column}')
+        assignments = ', '.join(f'{column} = ?' for column in values)
+        with self._lock, self._db:
+            self._db.execute(f'UPDATE manifests SET {assignments} WHERE identifier = ?',
+                             list(values.values()) + [identifier])
+
+    def get(self, identifier: str) -> Optional[CatalogEntry]:
+        """
+        Find one catalogued manifest
+
+        :param identifier: str the manifest's identifier
+        :return: Optional[CatalogEntry] the manifest, or None if it isn't catalogued
+        """
+        with self._lock:
+            row = self._db.execute('SELECT * FROM manifests WHERE identifier = ?', [identifier]).fetchone()
+        return CatalogEntry(dict(row)) if row else None
+
+    def query(self, patterns: Optional[dict] = None) -> list[CatalogEntry]:
+        """
+        Find catalogued manifests
+
+        :param patterns: Optional[dict] GLOB patterns by column (e.g. {'image_base': 'ms-2020-*'})
+        :return: list[CatalogEntry] the matching manifests, by identifier
+        """
+        patterns = patterns if patterns else {}
+        for column in patterns:
+            if column not in columns:
+                raise ValueError(f'Unknown catalog column {column}')
+        where = ' AND '.join(f'{column} GLOB ?' for column in patterns)
+        sql = f'SELECT * FROM manifests{" WHERE " + where if where else ""} ORDER BY identifier'
+        with self._lock:
+            rows = self._db.execute(sql, list(patterns.values())).fetchall()
+        return [CatalogEntry(dict(row)) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def parse_selection(selection: Optional[list[str]]) -> dict:
+    """
+    Parse column=pattern selections from the command line
+
+    :param selection: Optional[list[str]] e.g. ['image_base=ms-2020-*']
+    :return: dict patterns by column
+    """
+    patterns = {}
+    for item in selection or []:
+        column, _, pattern = item.partition('=')
+        patterns[column] = pattern
+    return patterns
@@ -9,7 +9,8 @@ root_dir = os.getcwd()
 
 defaults = {
     'image_dir': '/opt/cantaloupe/images',
-    'iif_url': 'https://iiif.bc.edu/iiif/2'
+    'iif_url': 'https://iiif.bc.edu/iiif/2',
+    'alma_api': 'https://api-na.hosted.exlibrisgroup.com/almaws/v1'
 }
 
 
@@ -22,6 +23,9 @@ class Config:
     aspace_passwd: str
     handle_url: str
     ssh: str
+    ssh_profile: str
+    ssh_headers: bool
+    image_layout: str
     source_record: str
     iiif_base_url: str
     manifest_dir: str
@@ -32,6 +36,45 @@ class Config:
     citation: str
     manifest_filename: str
     view_filename: str
+    report: str
+    prometheus: str
+    profile: str
+    local: bool
+    inventory: str
+    serve: str
+    submit: str
+    workers: int
+    queue_size: int
+    index_ttl: int
+    record_ttl: int
+    watch: bool
+    quiet_period: int
+    poll_interval: int
+    update: bool
+    compact: bool
+    compress: list
+    hash_index: str
+    prewarm: bool
+    catalog: str
+    layout: str
+    layout_depth: int
+    migrate_layout: str
+    regenerate: str
+    select: list
+    alma: bool
+    alma_api: str
+    alma_api_key: str
+    alma_concurrency: int
+    prewarm_pages: int
+    prewarm_concurrency: int
+    prewarm_rate: float
+    changes: str
+    pipeline: bool
+    preflight: bool
+    plan_only: bool
+    list_workers: int
+    lookup_workers: int
+    pipeline_queue: int
 
 
 def load_config() -> Config:
@@ -53,6 +96,46 @@ def load_config() -> Config:
     config.verbosity = max((30 - args.verbose * 10), 10) if args.verbose > 0 else 0
     config.manifest_filename = args.manifest
     config.view_filename = args.view
+    config.report = args.report
+    config.prometheus = args.prometheus
+    config.profile = args.profile
+    config.ssh_profile = args.ssh_profile
+    config.ssh_headers = args.ssh_headers
+    config.image_layout = args.image_layout
+    config.local = args.local
+    config.inventory = args.inventory
+    config.serve = args.serve
+    config.submit = args.submit
+    config.workers = args.workers
+    config.queue_size = args.queue_size
+    config.index_ttl = args.index_ttl
+    config.record_ttl = args.record_ttl
+    config.watch = args.watch
+    config.quiet_period = args.quiet_period
+    config.poll_interval = args.poll_interval
+    config.update = args.update
+    config.compact = args.compact
+    config.compress = args.compress or []
+    config.hash_index = args.hash_index
+    config.prewarm = args.prewarm
+    config.catalog = args.catalog
+    config.layout = args.layout
+    config.layout_depth = args.layout_depth
+    config.migrate_layout = args.migrate_layout
+    config.regenerate = args.regenerate
+    config.select = args.select
+    config.alma = args.alma
+    config.alma_concurrency = args.alma_concurrency
+    config.prewarm_pages = args.prewarm_pages
+    config.prewarm_concurrency = args.prewarm_concurrency
+    config.prewarm_rate = args.prewarm_rate
+    config.changes = args.changes
+    config.pipeline = args.pipeline
+    config.preflight = args.preflight
+    config.plan_only = args.plan_only
+    config.list_workers = args.list_workers
+    config.lookup_workers = args.lookup_workers
+    config.pipeline_queue = args.pipeline_queue
 
     # These could come from the env file or CLI arguments.
     config.ssh = args.ssh if args.ssh else dotenv['SSH_CREDENTIALS']
@@ -62,6 +145,8 @@ def load_config() -> Config:
     config.aspace_passwd = dotenv['ASPACE_PASSWD'] if 'ASPACE_PASSWD' in dotenv else getpass('ASpace admin password:')
     config.iiif_base_url = dotenv['IIIF_BASE_URL'] if 'IIIF_BASE_URL' in dotenv else defaults['iif_url']
     config.image_dir = args.image_dir if args.image_dir else defaults['image_dir']
+    config.alma_api = args.alma_api if args.alma_api else dotenv.get('ALMA_API_BASE', defaults['alma_api'])
+    config.alma_api_key = dotenv.get('ALMA_API_KEY')
 
     # These are either in the env file or use a local default.
     config.manifest_dir = dotenv['MANIFEST_DIR'] if 'MANIFEST_DIR' in dotenv else os.path.join(root_dir, 'manifests')
@@ -80,14 +165,81 @@ def get_args():
     :return: List the submitted arg values
     """
     parser = argparse.ArgumentParser(prog='manifester', add_help=True, description=__doc__)
-    parser.add_argument('source_record', help='the source record (MARC file, ASpace record, etc.) to process')
+    parser.add_argument('source_record', nargs='?',
+                        help='the source record (MARC file, ASpace record, etc.) to process')
+    parser.add_argument('--alma', action='store_true',
+                        help='the source record is a file of MMS IDs to fetch from the Alma Bibs API')
+    parser.add_argument('--alma_api', help='Alma API base URL')
+    parser.add_argument('--alma_concurrency', type=int, default=4, help='Alma API requests in flight at once')
     parser.add_argument('--image_base', help='image file prefix (e.g. ms-2020-020-142452)')
     parser.add_argument('--handle', help='Handle URL')
     parser.add_argument('--ssh', help='IIIF server SSH connection string (ex. florinb@scenery.bc.edu)')
+    parser.add_argument('--ssh_profile', choices=['default', 'wan'], default='default',
+                        help='SSH transport tuning: window sizes, compression, keepalive, pipelining and retries')
+    parser.add_argument('--ssh_headers', action='store_true',
+                        help='read image dimensions from the JP2 headers over SFTP instead of asking the IIIF server')
     parser.add_argument('--image_dir', help='image directory on IIIF server')
+    parser.add_argument('--image_layout', choices=['flat', 'hash', 'prefix'], default='flat',
+                        help='image directory layout: flat, or sharded into subdirectories by hash or collection prefix')
+    parser.add_argument('--local', action='store_true',
+                        help='read images from image_dir on this machine instead of over SSH')
+    parser.add_argument('--inventory', help='image inventory file (.csv or .jsonl of filename,width,height)')
     parser.add_argument('--citation', help='text of citation')
     parser.add_argument('--attribution', help='text of attribution')
     parser.add_argument('-v', '--verbose', action='count', default=0)
     parser.add_argument('--manifest', help='manifest file name')
     parser.add_argument('--view', help='view file name')
-    return parser.parse_args()
+    parser.add_argument('--compact', action='store_true', help='write manifests with no whitespace')
+    parser.add_argument('--compress', action='append', choices=['gzip', 'br'],
+                        help='also write a pre-compressed copy of each manifest (.json.gz or .json.br)')
+    parser.add_argument('--hash_index', help='file of output content hashes used to skip unchanged writes')
+    parser.add_argument('--changes', help='write the added, changed and unchanged identifiers to this JSON file')
+    parser.add_argument('--prewarm', action='store_true',
+                        help='request thumbnails and opening-page tiles from the IIIF server before writing handles')
+    parser.add_argument('--prewarm_pages', type=int, default=2, help='number of opening pages to warm tiles for')
+    parser.add_argument('--prewarm_concurrency', type=int, default=4, help='warming requests in flight at once')
+    parser.add_argument('--prewarm_rate', type=float, default=10, help='maximum warming requests per second')
+    parser.add_argument('--layout', choices=['flat', 'hash', 'prefix'], default='flat',
+                        help='output directory layout: flat, sharded by identifier hash or by collection prefix')
+    parser.add_argument('--layout_depth', type=int, default=1, help='levels of hash directories for --layout hash')
+    parser.add_argument('--migrate_layout', metavar='DIRECTORY',
+                        help='move the manifests and views in a flat output directory into --layout, then exit')
+    parser.add_argument('--catalog', help='SQLite catalog of built manifests to update (created if missing)')
+    parser.add_argument('--regenerate', choices=['views', 'handles'],
+                        help='rebuild view or handle files for catalogued manifests instead of processing a source')
+    parser.add_argument('--select', action='append', metavar='COLUMN=PATTERN',
+                        help='only regenerate catalogued manifests whose column matches the GLOB pattern')
+    parser.add_argument('--report', help='write a JSON run report with timings and I/O counts to this file')
+    parser.add_argument('--prometheus', help='write run metrics to this Prometheus textfile (.prom)')
+    parser.add_argument('--profile', help='run under cProfile and write the stats to this file')
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help='run as a service listening on host:port or unix:/path/to/socket')
+    parser.add_argument('--submit', metavar='ADDRESS', help='submit the source record to a running service')
+    parser.add_argument('--workers', type=int, default=2, help='number of jobs the service runs at once')
+    parser.add_argument('--queue_size', type=int, default=100, help='maximum number of jobs waiting in the service')
+    parser.add_argument('--index_ttl', type=int, default=60,
+                        help='seconds before the service re-lists the image directory')
+    parser.add_argument('--record_ttl', type=int, default=300,
+                        help='seconds the service reuses a looked-up ASpace record')
+    parser.add_argument('--update', action='store_true',
+                        help='reuse image dimensions from the existing manifest; only look up new images')
+    parser.add_argument('--preflight', action='store_true',
+                        help='check every record against the image listing before building any, and stop on problems')
+    parser.add_argument('--plan_only', '--plan-only', action='store_true',
+                        help='print the preflight plan and estimated request counts, then exit without building')
+    parser.add_argument('--pipeline', action='store_true',
+                        help="overlap the next records' image lookups with the current record's writes")
+    parser.add_argument('--list_workers', type=int, default=2, help='pipeline: records listed at once')
+    parser.add_argument('--lookup_workers', type=int, default=2,
+                        help='pipeline: records having image dimensions looked up at once')
+    parser.add_argument('--pipeline_queue', type=int, default=2,
+                        help='pipeline: maximum records waiting between two stages')
+    parser.add_argument('--watch', action='store_true',
+                        help="wait for each record's images to finish uploading, then build it")
+    parser.add_argument('--quiet_period', type=int, default=120,
+                        help='seconds an image sequence must stop growing before it is built')
+    parser.add_argument('--poll_interval', type=int, default=15, help='seconds between image directory polls')
+    args = parser.parse_args()
+    if not args.source_record and not args.serve and not args.regenerate and not args.migrate_layout:
+        parser.error('the following arguments are required: source_record')
+    return args
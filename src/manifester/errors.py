@@ -8,3 +8,9 @@ class BadImageInfoURLError(Exception):
     def __init__(self, msg='404 when looking up image info.json file'):
         self.msg = msg
         super().__init__(self.msg)
+
+
+class AlmaAPIError(Exception):
+    def __init__(self, msg='Error response from the Alma API'):
+        self.msg = msg
+        super().__init__(self.msg)
@@ -2,6 +2,7 @@ import logging
 import os.path
 
 from typing import Optional
+from urllib.parse import quote
 
 
 class Image:
@@ -10,21 +11,25 @@ class Image:
 
     Attributes:
         short_name (str): e.g. 'bc-2022-172_0042'
+        identifier (str): e.g. 'bc-2022-172_0042.jp2', or 'bc-2022%2Fbc-2022-172_0042.jp2' in a shard
         info_url (str): e.g. 'https://iiif.bc.edu/iiif/2/bc-2022-172_0042.jp2/info.json'
     """
     annotation_url: str
     short_name: str
+    identifier: str
     info_url: str
     filename: str
+    path: str
     height: Optional[str]
     width: Optional[str]
 
-    def __init__(self, filepath: str, base_url: str):
+    def __init__(self, filepath: str, base_url: str, shard: Optional[str] = None):
         """
         Constructor
 
         :param filepath: the full path to the file on the local machine (e.g. /opt/cantaloupe/images/bc2023-159_0019.jp2)
         :param base_url: str base URL for the IIIF server
+        :param shard: Optional[str] the image directory subdirectory the file is in (e.g. 'bc-2023'), if sharded
         :param lookup: bool should we look up the image dimensions?
         """
         # Delete any extra trailing slash on base.
@@ -42,8 +47,15 @@ class Image:
         # The image identifier minus the counter (e.g. 'bc-2022-172')
         self.cui = self.short_name[0:len(self.short_name) - 5]
 
+        # The path relative to the image directory (e.g. 'bc-2022/bc-2022-172_0042.jp2')
+        self.path = f'{shard}/{self.filename}' if shard else self.filename
+
+        # The IIIF identifier. Cantaloupe's filesystem source resolves an encoded slash to a
+        # subdirectory (e.g. 'bc-2022%2Fbc-2022-172_0042.jp2').
+        self.identifier = quote(self.path, safe='')
+
         # The base IIIF URL for the image (e.g. 'https://iiif.bc.edu/iiif/2/bc-2022-172_0042.jp2')
-        self.image_url = f'{base_url}/{self.filename}'
+        self.image_url = f'{base_url}/{self.identifier}'
 
         # The IIIF info URL (e.g. 'https://iiif.bc.edu/iiif/2/bc-2022-172_0042.jp2/info.json')
         self.info_url = f'{self.image_url}/info.json'
@@ -0,0 +1,290 @@
+import fnmatch
+import logging
+import re
+import stat
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from manifester.layout import Layout
+from manifester.singleflight import SingleFlight
+
+# Default image file permissions (0664). Must be world-readable for the IIIF server.
+permissions = (stat.S_IRUSR |  # readable by owner
+               stat.S_IWUSR |  # writeable by owner
+               stat.S_IRUSR |  # readable by group
+               stat.S_IRGRP |  # writeable by group
+               stat.S_IROTH  # readable by others
+               )
+
+
+class ImageSource(ABC):
+    """
+    Abstract source of IIIF image files
+
+    Subclasses populate `files` with the names of every image they know about in
+    `refresh()` and may supply dimensions and fix file permissions. Listings are shared by
+    every request that resolves to the same image base until the next refresh.
+
+    In a sharded image directory, `files` stays empty and each shard is listed the first
+    time an image base in it is looked for, by the `list_shard(shard)` method of sources that
+    support sharding, which returns the file names in the subdirectory. Image filenames are
+    then paths relative to the image directory (e.g. 'bc-2022/bc-2022-172_0001.jp2').
+
+    Sources whose listings carry modification times and sizes keep them in `_stamps`, by
+    filename, so replaced images can be told apart from unchanged ones. When a later listing
+    shows a known file has changed, `on_change` is called with its filename.
+    """
+    files: list
+    refreshed: float
+    layout: Layout = Layout()
+    _listings: SingleFlight
+    _shards: SingleFlight
+    _stamps: dict
+
+    # Whether dimensions() answers without asking the IIIF server.
+    knows_dimensions = False
+
+    # Shards listed at once by prepare().
+    listing_workers = 1
+
+    # Called with the filename of each known image whose listing changed (e.g. it was replaced).
+    on_change: Optional[Callable[[str], None]] = None
+
+    def list_images(self, image_base: str) -> list[str]:
+        """
+        List image files matching an image base
+
+        Iterate through several variations on possible image file name bases if necessary.
+
+        :type image_base: str the base of the filename to look for (e.g. ms-2020-020-142452)
+        :rtype: list[str] a list of jp2 files in the image directory that match our image base
+        """
+        resolved_base, image_files = self.resolve(image_base)
+        if len(image_files) == 0:
+            return []
+
+        def fix() -> list[str]:
+            self.fix_permissions(image_files)
+            return image_files
+
+        return list(self._listings.do(resolved_base, fix))
+
+    def prepare(self, image_bases: Iterable[str]) -> None:
+        """
+        List the shards of a batch's image bases, in parallel, before they are built
+
+        Only the shard of each base as given is listed; the shards of its name variants are
+        listed by `resolve()` if the images aren't there.
+
+        :param image_bases: Iterable[str] the batch's image bases
+        """
+        if not self.layout.sharded:
+            return
+        shards = sorted({shard_path(self.layout, image_base) for image_base in image_bases})
+        logging.info(f'Listing {len(shards)} image shards')
+        with ThreadPoolExecutor(max_workers=self.listing_workers) as executor:
+            list(executor.map(self._shard_files, shards))
+
+    def find_images(self, image_base: str) -> list[str]:
+        """
+        List image files matching an image base without touching the files
+
+        :type image_base: str the base of the filename to look for (e.g. ms-2020-020-142452)
+        :rtype: list[str] a list of jp2 files that match our image base
+        """
+        return self.resolve(image_base)[1]
+
+    def resolve(self, image_base: str) -> tuple[Optional[str], list[str]]:
+        """
+        Find the variant of an image base that the image files actually use
+
+        :type image_base: str the base of the filename to look for (e.g. ms-2020-020-142452)
+        :rtype: tuple[Optional[str], list[str]] the matching variant and its files, or (None, [])
+        """
+        for variant in name_variants(image_base):
+            logging.info(f'Looking for {variant}')
+            image_files = self._list_files(variant)
+            if len(image_files) > 0:
+                return variant, image_files
+
+        # Still nada? Give up.
+        return None, []
+
+    @abstractmethod
+    def refresh(self) -> None:
+        """
+        Reload the list of image files
+
+        Implementations should set `refreshed` by calling `_mark_refreshed()`.
+        """
+        pass
+
+    def age(self) -> float:
+        """
+        Seconds since the list of image files was loaded
+
+        :return: float
+        """
+        return time.monotonic() - self.refreshed
+
+    def dimensions(self, filename: str) -> Optional[tuple[int, int]]:
+        """
+        Width and height of an image, if the source knows them without asking the IIIF server
+
+        :param filename: str the image filename
+        :return: Optional[tuple[int, int]] (width, height), or None if unknown
+        """
+        return None
+
+    def fix_permissions(self, image_files: list[str]) -> None:
+        """
+        Make image files readable by the IIIF server
+
+        :param image_files: list[str] the image filenames
+        """
+        pass
+
+    def stamp(self, filename: str) -> Optional[tuple[float, int]]:
+        """
+        An image's modification time and size, as of its listing
+
+        :param filename: str the image filename
+        :return: Optional[tuple[float, int]] (mtime, size), or None if unknown
+        """
+        return getattr(self, '_stamps', {}).get(filename)
+
+    def modified(self, filename: str) -> Optional[float]:
+        """
+        When an image was last modified, as of its listing
+
+        :param filename: str the image filename
+        :return: Optional[float] seconds since the epoch, or None if unknown
+        """
+        stamp = self.stamp(filename)
+        return stamp[0] if stamp else None
+
+    def unchanged(self, image_files: list[str], stamps: dict[str, tuple[float, int]]) -> list[str]:
+        """
+        The image files whose modification time and size are the same as recorded
+
+        :param image_files: list[str] the image filenames
+        :param stamps: dict[str, tuple[float, int]] recorded (mtime, size) by filename
+        :return: list[str] the unchanged files
+        """
+        return [image_file for image_file in image_files
+                if image_file in stamps and self.stamp(image_file) == stamps[image_file]]
+
+    def unchanged_since(self, image_files: list[str], timestamp: float) -> list[str]:
+        """
+        The image files that haven't been modified since a time
+
+        Files with no known modification time are left out, since they may have changed.
+
+        :param image_files: list[str] the image filenames
+        :param timestamp: float seconds since the epoch (e.g. when a manifest was written)
+        :return: list[str] the unmodified files
+        """
+        unchanged = []
+        for image_file in image_files:
+            modified = self.modified(image_file)
+            if modified is not None and modified <= timestamp:
+                unchanged.append(image_file)
+        return unchanged
+
+    @abstractmethod
+    def __str__(self) -> str:
+        pass
+
+    def _mark_refreshed(self) -> None:
+        self.refreshed = time.monotonic()
+        self._listings = SingleFlight('listings')
+        self._shards = SingleFlight('shards')
+
+    def _record_stamps(self, stamps: dict[str, tuple[float, int]]) -> None:
+        changed = [filename for filename, stamp in stamps.items()
+                   if filename in self._stamps and self._stamps[filename] != stamp]
+        self._stamps.update(stamps)
+        if self.on_change:
+            for filename in changed:
+                logging.info(f'{filename} has changed')
+                self.on_change(filename)
+
+    def _shard_files(self, shard: str) -> list[str]:
+        return self._shards.do(shard, lambda: self.list_shard(shard))
+
+    def _list_files(self, image_base: str) -> list[str]:
+        if self.layout.sharded:
+            shard = shard_path(self.layout, image_base)
+            return sorted(f'{shard}/{file}' for file in self._shard_files(shard)
+                          if fnmatch.fnmatch(file, f'{image_base}*'))
+
+        image_files = []
+        for file in self.files:
+            if fnmatch.fnmatch(file, f'{image_base}*'):
+                image_files.append(file)
+        image_files.sort()
+        return image_files
+
+
+def shard_path(layout: Layout, image_base: str) -> str:
+    """
+    The subdirectory of the image directory an image base's files are in
+
+    :param layout: Layout the image directory layout
+    :param image_base: str the image base (e.g. bc-2022-172)
+    :return: str e.g. 'bc-2022', or '' in a flat image directory
+    """
+    return '/'.join(layout.shard(image_base))
+
+
+def name_variants(image_base: str) -> list[str]:
+    """
+    Possible image file name bases, in the order to try them
+
+    :param image_base: str the base as given (e.g. MS2020_020)
+    :return: list[str] the bare base, then lowercased, dashed, and underscore variants
+    """
+    # First try the bare image base.
+    variants = [image_base]
+
+    # No results? Try everything lowercased.
+    image_base = image_base.lower()
+    variants.append(image_base)
+
+    # Still no results? Add strategic dashes.
+    image_base = re.sub(r'^([a-z]+)(\d+)', r'\1-\2', image_base)
+    variants.append(image_base)
+
+    # Still no results? Convert underscores to dashes.
+    image_base = image_base.replace('_', '-')
+    variants.append(image_base)
+
+    # Still nothing? Convert dashes to underscores.
+    image_base = image_base.replace('-', '_')
+    variants.append(image_base)
+
+    # Drop repeats (e.g. a base that was already lowercase) but keep the order.
+    return list(dict.fromkeys(variants))
+
+
+def sequence_gaps(filenames: list[str]) -> list[int]:
+    """
+    Find missing counters in an image sequence
+
+    Image files end in a 4-digit counter (e.g. bc-2022-172_0042.jp2) that should run
+    from 0001 with no gaps.
+
+    :param filenames: list[str] the image filenames
+    :return: list[int] the missing counters, empty if the sequence is contiguous
+    """
+    counters = set()
+    for filename in filenames:
+        short_name = filename.rsplit('/', 1)[-1].split('.')[0]
+        counter = short_name[len(short_name) - 4:]
+        if counter.isdigit():
+            counters.add(int(counter))
+    if not counters:
+        return []
+    return [counter for counter in range(1, max(counters) + 1) if counter not in counters]
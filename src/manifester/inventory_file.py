@@ -0,0 +1,58 @@
+import csv
+import json
+import logging
+from typing import Optional
+
+from manifester.image_source import ImageSource
+
+
+class InventoryFile(ImageSource):
+    """
+    Precomputed image inventory
+
+    A JSON-lines file of {"filename": ..., "width": ..., "height": ...} objects or a CSV
+    file of filename,width,height rows, as produced by the ingest pipeline. Building
+    manifests from an inventory needs no network I/O.
+    """
+    inventory_file: str
+    files: list
+    _dimensions: dict
+
+    knows_dimensions = True
+
+    def __init__(self, inventory_file: str):
+        """
+        Constructor
+
+        :param inventory_file: str path to a .csv or .jsonl inventory
+        """
+        self.inventory_file = inventory_file
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Read the inventory file
+        """
+        dimensions = {}
+        with open(self.inventory_file, newline='') as fh:
+            if self.inventory_file.endswith('.csv'):
+                rows = [row for row in csv.reader(fh) if row and row[0] != 'filename']
+            else:
+                rows = [_jsonl_row(line) for line in fh if line.strip()]
+        for filename, width, height in rows:
+            dimensions[filename] = (int(width), int(height))
+        self._dimensions = dimensions
+        self.files = list(dimensions.keys())
+        self._mark_refreshed()
+        logging.info(f'Read {len(self.files)} images from {self.inventory_file}')
+
+    def __str__(self) -> str:
+        return self.inventory_file
+
+    def dimensions(self, filename: str) -> Optional[tuple[int, int]]:
+        return self._dimensions.get(filename)
+
+
+def _jsonl_row(line: str) -> tuple:
+    entry = json.loads(line)
+    return entry['filename'], entry['width'], entry['height']
@@ -0,0 +1,148 @@
+"""
+Where manifests and views are written, and the URLs they are served at
+
+Very large output sets can be sharded into subdirectories, so no single directory holds
+tens of thousands of files. Paths and URLs both come from the same layout, so the files,
+manifest @ids, views, handles and catalog all agree. Image directories can be sharded the
+same way.
+"""
+import hashlib
+import logging
+import os
+import re
+from typing import Optional
+
+from manifester.output import HashIndex, compression_formats, write_text
+
+manifest_base_url = 'https://library.bc.edu/iiif/manifests'
+view_base_url = 'https://library.bc.edu/iiif/view'
+
+# Supported layouts.
+layouts = ['flat', 'hash', 'prefix']
+
+# Collection prefix: everything before the identifier's last '-' or '_' part (e.g. 'ms-2020-020'
+# for 'ms-2020-020-142452').
+collection_pattern = re.compile(r'^(.+)[-_][^-_]+$')
+
+
+class Layout:
+    """
+    Maps identifiers (or image bases) to the subdirectories they are sharded into
+
+    Layouts:
+        flat: no subdirectories (e.g. 'bc-2022-172.json')
+        hash: under leading pairs of hex digits of the identifier's SHA-256 (e.g. '3f/bc-2022-172.json')
+        prefix: under the collection prefix (e.g. 'bc-2022/bc-2022-172.json'), or by hash for
+            identifiers with no prefix (e.g. MMS IDs)
+    """
+    scheme: str
+    depth: int
+
+    def __init__(self, scheme: str = 'flat', depth: int = 1):
+        """
+        Constructor
+
+        :param scheme: str 'flat', 'hash' or 'prefix'
+        :param depth: int levels of hash directories (256 directories per level)
+        """
+        if scheme not in layouts:
+            raise ValueError(f'Unknown layout {scheme}')
+        self.scheme = scheme
+        self.depth = depth
+
+    @property
+    def sharded(self) -> bool:
+        return self.scheme != 'flat'
+
+    def shard(self, identifier: str) -> list[str]:
+        """
+        The subdirectories an identifier's files go in
+
+        :param identifier: str the record identifier or image base
+        :return: list[str] directory names, outermost first; empty for the flat layout
+        """
+        if self.scheme == 'flat':
+            return []
+        if self.scheme == 'prefix':
+            match = collection_pattern.match(identifier)
+            if match:
+                return [match.group(1)]
+        digest = hashlib.sha256(identifier.encode('utf-8')).hexdigest()
+        return [digest[level * 2:level * 2 + 2] for level in range(self.depth)]
+
+
+class OutputLayout(Layout):
+    """
+    Maps identifiers to output paths and URLs
+    """
+    def path(self, identifier: str, extension: str, directory: str = '') -> str:
+        """
+        An output file's path
+
+        :param identifier: str the record identifier
+        :param extension: str e.g. '.json'
+        :param directory: str the output directory
+        :return: str e.g. '3f/bc-2022-172.json'
+        """
+        return os.path.join(directory, *self.shard(identifier), f'{identifier}{extension}')
+
+    def manifest_url(self, identifier: str) -> str:
+        return '/'.join([manifest_base_url, *self.shard(identifier), f'{identifier}.json'])
+
+    def view_url(self, identifier: str) -> str:
+        return '/'.join([view_base_url, *self.shard(identifier), identifier])
+
+
+def migrate(directory: str, layout: OutputLayout, hash_index: Optional[HashIndex] = None) -> list[tuple[str, str]]:
+    """
+    Move the manifests and views in a flat output directory into a sharded layout
+
+    Manifest @ids and the manifest URLs in views are rewritten to their new URLs, and
+    pre-compressed copies are rebuilt. Other files are left alone.
+
+    :param directory: str the flat output directory
+    :param layout: OutputLayout the layout to move to
+    :param hash_index: Optional[HashIndex] hashes of the output files
+    :return: list[tuple[str, str]] the old and new URL of every moved manifest and view
+    """
+    flat = OutputLayout()
+    with os.scandir(directory) as entries:
+        names = {entry.name for entry in entries if entry.is_file()}
+
+    redirects = []
+    for name in sorted(names):
+        identifier, extension = os.path.splitext(name)
+        if extension not in ('.json', '.html'):
+            continue
+        old_path = os.path.join(directory, name)
+        new_path = layout.path(identifier, extension, directory)
+        if new_path == old_path:
+            continue
+        with open(old_path, encoding='utf-8') as fh:
+            text = fh.read()
+
+        # Skip anything that isn't ours, like change lists and hash indexes.
+        if extension == '.json' and '"sc:Manifest"' not in text:
+            continue
+        if extension == '.html' and 'manifestUri' not in text:
+            continue
+
+        old_manifest_url = flat.manifest_url(identifier)
+        new_manifest_url = layout.manifest_url(identifier)
+        text = text.replace(f'"{old_manifest_url}"', f'"{new_manifest_url}"')
+
+        if extension == '.json':
+            compress = [compression for compression, suffix in compression_formats.items()
+                        if f'{name}{suffix}' in names]
+            write_text(new_path, text, hash_index, compress=compress)
+            for compression in compress:
+                os.remove(f'{old_path}{compression_formats[compression]}')
+            redirects.append((old_manifest_url, new_manifest_url))
+        else:
+            write_text(new_path, text, hash_index)
+            redirects.append((flat.view_url(identifier), layout.view_url(identifier)))
+        os.remove(old_path)
+        if hash_index:
+            hash_index.forget(old_path)
+        logging.info(f'Moved {old_path} to {new_path}')
+    return redirects
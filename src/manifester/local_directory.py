@@ -0,0 +1,137 @@
+import logging
+import os
+import stat
+import struct
+from typing import Optional
+
+from manifester.image_source import ImageSource, permissions
+from manifester.layout import Layout
+from manifester.metrics import metrics
+
+
+class LocalDirectory(ImageSource):
+    """
+    Image directory on the local filesystem
+
+    Used when running on the IIIF host itself. Dimensions are read from the JP2 headers,
+    so no info.json requests are needed.
+    """
+    image_dir: str
+    files: list
+
+    knows_dimensions = True
+
+    # Shards scanned at once by prepare().
+    listing_workers = 4
+
+    def __init__(self, image_dir: str, layout: Optional[Layout] = None):
+        """
+        Constructor
+
+        :param image_dir: str the directory holding the JP2 files
+        :param layout: Optional[Layout] how the directory is sharded; flat by default
+        """
+        self.image_dir = image_dir
+        self._stamps = {}
+        if layout:
+            self.layout = layout
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Scan the image directory, or forget the scanned shards of a sharded one
+
+        The old listing is used until the new one is complete.
+        """
+        files = []
+        if not self.layout.sharded:
+            with metrics.timer('scandir'):
+                files = self._scan(self.image_dir, '')
+        self.files = files
+        self._mark_refreshed()
+
+    def list_shard(self, shard: str) -> list[str]:
+        """
+        Scan one subdirectory of a sharded image directory
+
+        :param shard: str the subdirectory (e.g. 'bc-2022')
+        :return: list[str] the file names in it, or an empty list if it doesn't exist
+        """
+        with metrics.timer('scandir'):
+            try:
+                return self._scan(os.path.join(self.image_dir, shard), f'{shard}/')
+            except FileNotFoundError:
+                return []
+
+    def _scan(self, directory: str, prefix: str) -> list[str]:
+        names = []
+        stamps = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    info = entry.stat()
+                    names.append(entry.name)
+                    stamps[f'{prefix}{entry.name}'] = (info.st_mtime, info.st_size)
+        self._record_stamps(stamps)
+        return names
+
+    def __str__(self) -> str:
+        return self.image_dir
+
+    def dimensions(self, filename: str) -> Optional[tuple[int, int]]:
+        """
+        Read the width and height from the JP2 image header box
+
+        :param filename: str the image filename
+        :return: Optional[tuple[int, int]] (width, height), or None if the header can't be read
+        """
+        with metrics.timer('read_jp2_header'):
+            try:
+                with open(os.path.join(self.image_dir, filename), 'rb') as fh:
+                    return jp2_dimensions(fh)
+            except OSError as e:
+                logging.warning(f'Could not read header of {filename}: {e}')
+                return None
+
+    def fix_permissions(self, image_files: list[str]) -> None:
+        """
+        Set image file permissions to be readable by IIIF server
+
+        :param image_files: list[str] the image filenames
+        """
+        for image_file in image_files:
+            full_path = os.path.join(self.image_dir, image_file)
+            info = os.stat(full_path)
+            if not bool(info.st_mode & stat.S_IROTH):
+                logging.info(f'Setting permissions for {full_path}')
+                os.chmod(full_path, permissions)
+
+
+def jp2_dimensions(fh) -> Optional[tuple[int, int]]:
+    """
+    Find the image header (ihdr) inside the JP2 header (jp2h) box
+
+    :param fh: a binary file handle positioned at the start of a JP2 file
+    :return: Optional[tuple[int, int]] (width, height), or None if no header was found
+    """
+    end = None
+    while True:
+        header = fh.read(8)
+        if len(header) < 8:
+            return None
+        length, box_type = struct.unpack('>I4s', header)
+        header_length = 8
+        if length == 1:
+            length = struct.unpack('>Q', fh.read(8))[0]
+            header_length = 16
+
+        if box_type == b'jp2h':
+            # Descend into the superbox.
+            end = fh.tell() + length - header_length if length else None
+            continue
+        if box_type == b'ihdr':
+            height, width = struct.unpack('>II', fh.read(8))
+            return width, height
+        if length == 0 or (end is not None and fh.tell() >= end):
+            return None
+        fh.seek(length - header_length, os.SEEK_CUR)
@@ -1,13 +1,18 @@
+from typing import Optional
+from urllib.parse import unquote
+
 from manifester.image import Image
 from manifester.source_record import SourceRecord
 
 
-def build_manifest(image_list: list[Image], source: SourceRecord, handle_url: str) -> dict:
+def build_manifest(image_list: list[Image], source: SourceRecord, handle_url: str,
+                   manifest_url: Optional[str] = None) -> dict:
     """
     Build the manifest
 
     :param image_list: list[Image] the images to deliver
     :param source: SourceRecord the source record
+    :param manifest_url: Optional[str] the manifest's URL; defaults to the source record's
     :return:
     """
 
@@ -16,7 +21,7 @@ def build_manifest(image_list: list[Image], source: SourceRecord, handle_url: st
     # Build the JSON
     return {
         '@context': 'http://iiif.io/api/presentation/2/context.json',
-        '@id': source.manifest_url,
+        '@id': manifest_url if manifest_url else source.manifest_url,
         '@type': 'sc:Manifest',
         'label': source.title,
         'thumbnail': image_list[0].thumbnail_url,
@@ -94,3 +99,23 @@ def build_structure(image: Image):
             image.canvas_url
         ]
     }
+
+
+def read_dimensions(manifest: dict) -> dict[str, tuple[int, int]]:
+    """
+    Read the image dimensions recorded in an existing manifest
+
+    :param manifest: dict a manifest built by build_manifest
+    :return: dict[str, tuple[int, int]] (width, height) by image filename
+    """
+    dimensions = {}
+    for sequence in manifest.get('sequences', []):
+        for canvas in sequence.get('canvases', []):
+            for annotation in canvas.get('images', []):
+                resource = annotation['resource']
+                image_url = resource['service']['@id']
+                # Images in a sharded image directory have their subdirectory in the identifier.
+                filename = unquote(image_url.rstrip('/').rsplit('/', 1)[-1]).rsplit('/', 1)[-1]
+                if resource.get('width') and resource.get('height'):
+                    dimensions[filename] = (resource['width'], resource['height'])
+    return dimensions
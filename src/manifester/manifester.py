@@ -1,31 +1,61 @@
 """
 Produce a IIIF-compliant JSON manifest from a binary MARC file and a folder full of JP2s
 """
+import cProfile
 import json
 import os.path
+import threading
 from datetime import datetime
-from time import sleep
-from typing import Optional, List
+from itertools import islice
+from time import perf_counter, sleep
+from typing import Iterable, Iterator, Optional, List
 
 from pymarc import MARCReader
 import urllib3
 import sys
 import logging as log
 
+from manifester import aspace_client, service
+from manifester.alma_client import fetch_bibs, read_mms_ids
 from manifester.alma_record import AlmaRecord
 from manifester.aspace_client import lookup
 from manifester.aspace_lookup import ASpaceLookup
+from manifester.catalog import Catalog, parse_selection
 from manifester.config import load_config
 from manifester.errors import BadImageInfoURLError
 from manifester.image import Image
-from manifester.manifest_builder import build_manifest
+from manifester.image_source import ImageSource
+from manifester.inventory_file import InventoryFile
+from manifester.layout import Layout, OutputLayout, migrate
+from manifester.local_directory import LocalDirectory
+from manifester.manifest_builder import build_manifest, read_dimensions
+from manifester.marcxml import iter_records
+from manifester.metrics import metrics
+from manifester.output import ADDED, CHANGED, UNCHANGED, HashIndex, check_compression, write_json, write_text
+from manifester.pipeline import Stage, run_pipeline
+from manifester.preflight import plan
+from manifester.prewarm import prewarm, warm_urls
+from manifester.singleflight import SingleFlight
 from manifester.source_record import SourceRecord
-from manifester.ssh_connection import SSHConnection
+from manifester.ssh_connection import SSHConnection, transport_profiles
+from manifester.watcher import SequenceWatcher
 from manifester.xlsx_reader import read_excel
 
 src_path = os.path.dirname(__file__)
 http = urllib3.PoolManager()
 
+# Image dimensions already looked up (or being looked up), by filename.
+dimension_cache = SingleFlight('dimensions')
+
+# Identifiers whose outputs were added, changed or left unchanged by this run.
+changes = {ADDED: [], CHANGED: [], UNCHANGED: []}
+
+# Records whose image shards are listed together, in a sharded image directory.
+shard_chunk_size = 100
+
+# Held while the image source is re-listed, so service jobs don't list it twice at once.
+refresh_lock = threading.Lock()
+
 # Load the input we need to finish the process from CLI args, env files, and possibly
 # user input during runtime.
 config = load_config()
@@ -36,78 +66,304 @@ if config.verbosity:
 else:
     log.basicConfig(format="%(levelname)s: %(message)s")
 
-# Build a connection for SFTPing files if they entered an SSH connection string.
-log.info(f'Opening SSH connection as {config.ssh}')
-if config.ssh:
-    remote_dir = SSHConnection(config.ssh, config.image_dir)
+# Hashes of the output files, to avoid rewriting files whose content hasn't changed.
+hash_index = HashIndex(config.hash_index)
+
+# Where the manifests and views go.
+output_layout = OutputLayout(config.layout, config.layout_depth)
+
+# Record of every manifest built.
+catalog = Catalog(config.catalog) if config.catalog else None
+
+# How the image directory is sharded.
+image_layout = Layout(config.image_layout)
+
+# Pick where to find the images: a precomputed inventory, the local image directory, or
+# a connection for SFTPing files if they entered an SSH connection string.
+image_source: Optional[ImageSource]
+if config.submit or config.regenerate or config.migrate_layout:
+    # The service has its own image source, and regenerating from the catalog or moving
+    # output files needs none.
+    image_source = None
+elif config.inventory:
+    if image_layout.sharded:
+        # Inventory filenames have no shard, so the IIIF identifiers would be flat.
+        raise Exception('--inventory does not support sharded image directories (--image_layout)')
+    log.info(f'Reading image inventory {config.inventory}')
+    image_source = InventoryFile(config.inventory)
+elif config.local:
+    log.info(f'Reading local image directory {config.image_dir}')
+    image_source = LocalDirectory(config.image_dir, image_layout)
+elif config.ssh:
+    log.info(f'Opening SSH connection as {config.ssh}')
+    image_source = SSHConnection(config.ssh, config.image_dir, transport_profiles[config.ssh_profile],
+                                 read_headers=config.ssh_headers, layout=image_layout)
 else:
-    remote_dir = None
+    image_source = None
+
+if image_source:
+    # Dimensions are cached by file name, without any image directory shard.
+    image_source.on_change = lambda image_filename: dimension_cache.forget(image_filename.rsplit('/', 1)[-1])
 
 
 def main():
     """
     Main process
     """
+    profiler = cProfile.Profile() if config.profile else None
+    if profiler:
+        profiler.enable()
+
+    try:
+        if config.submit:
+            submit_job()
+        elif config.serve:
+            serve()
+        elif config.watch:
+            watch()
+        elif config.regenerate:
+            regenerate()
+        elif config.migrate_layout:
+            migrate_layout()
+        else:
+            run()
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(config.profile)
+            log.info(f'Wrote profile to {config.profile}')
+        hash_index.save()
+        write_change_list()
+        write_metrics()
+
+
+def run():
+    """
+    Build manifests for every record in the source
+    """
     check_requirements()
 
-    log.info(f'Reading {config.source_record}')
+    source_records = load_records(config.source_record, config.image_base)
+
+    if image_source and image_layout.sharded:
+        source_records = prepare_shards(source_records, config.image_base)
+
+    if config.preflight or config.plan_only:
+        # Planning takes the whole batch.
+        source_records = list(source_records)
+        if not preflight(source_records, config.image_base):
+            raise Exception('Preflight found problems; nothing was built')
+        if config.plan_only:
+            return
+
+    if config.pipeline:
+        run_pipelined(source_records, config.image_base)
+        return
+
+    for source_record in source_records:
+        if source_record.identifier is not None:
+            process_record(source_record, config.image_base)
+
+
+def prepare_shards(source_records: Iterable[SourceRecord], image_base: Optional[str]) -> Iterator[SourceRecord]:
+    """
+    List the image shards each chunk of records needs, in parallel, as the batch reaches it
+
+    :param source_records: Iterable[SourceRecord] the records
+    :param image_base: Optional[str] image file prefix for every record; defaults to each identifier
+    :return: Iterator[SourceRecord] the same records
+    """
+    source_records = iter(source_records)
+    while True:
+        chunk = list(islice(source_records, shard_chunk_size))
+        if not chunk:
+            return
+        image_bases = [image_base if image_base else record.identifier
+                       for record in chunk if record.identifier is not None]
+        with metrics.timer('list_shards'):
+            image_source.prepare(image_bases)
+        yield from chunk
+
+
+def run_pipelined(source_records: Iterable[SourceRecord], image_base: Optional[str]) -> None:
+    """
+    Process records in overlapping stages
+
+    The next records' image listings and dimension lookups run while the current record's
+    outputs are serialized and written. Outputs are written in source order.
+
+    :param source_records: Iterable[SourceRecord] the records
+    :param image_base: Optional[str] image file prefix for every record
+    :return: None
+    """
+    records = (record for record in source_records if record.identifier is not None)
+    stages = [
+        Stage('list', lambda record: (record, find_record_images(record, image_base)),
+              concurrency=config.list_workers),
+        Stage('dimensions', lambda listed: (listed[0], lookup_images(listed[0], listed[1])),
+              concurrency=config.lookup_workers),
+        Stage('write', lambda looked_up: write_record(*looked_up), ordered=True)
+    ]
+    run_pipeline(records, stages, queue_size=config.pipeline_queue)
+
+
+def preflight(source_records: list[SourceRecord], image_base: Optional[str]) -> bool:
+    """
+    Check the batch against the image listing and print the plan
+
+    :param source_records: list[SourceRecord] the records
+    :param image_base: Optional[str] image file prefix for every record
+    :return: bool whether the batch can be built
+    """
+    with metrics.timer('preflight'):
+        batch_plan = plan(source_records, image_source, image_base, outputs_per_record=3 + len(config.compress),
+                          handle_url=config.handle_url)
+    print(batch_plan.report())
+    return batch_plan.ok
+
+
+def load_records(source: str, image_base: Optional[str]) -> Iterable[SourceRecord]:
+    """
+    Read the source records from a file, Alma or ASpace
+
+    :param source: str the source record file, MMS ID list or ASpace record URL path
+    :param image_base: Optional[str] image file prefix to use as the identifier
+    :return: Iterable[SourceRecord] the records
+    """
+    log.info(f'Reading {source}')
+
+    if config.alma:
+        return fetch_bibs(read_mms_ids(source), config.alma_api_key, config.alma_api,
+                          concurrency=config.alma_concurrency, identifier=image_base)
 
     # For now, anything that ends in '.mrc' is a binary MARC file, while everything else is a
     # ASpace record.
     # @todo figure out a better way to identify record types
-    if config.source_record.endswith('.mrc'):
-        source_records = read_marc_file(config.source_record, config.image_base)
-    elif config.source_record.endswith('.xlsx'):
-        source_records = read_excel(config.source_record)
-    elif config.source_record.endswith('.csv'):
-        source_records = read_marc_file(config.source_record, config.image_base)
+    if source.endswith('.mrc'):
+        return read_marc_file(source, image_base)
+    elif source.endswith('.xml'):
+        return read_marcxml_file(source, image_base)
+    elif source.endswith('.xlsx'):
+        return read_excel(source)
+    elif source.endswith('.csv'):
+        return read_marc_file(source, image_base)
     else:
-        aspace_response = lookup(config.source_record, 'admin', config.aspace_passwd)
-        source_records = [ASpaceLookup(aspace_response, config.image_base)]
+        aspace_response = lookup(source, 'admin', config.aspace_passwd, config.record_ttl)
+        return [ASpaceLookup(aspace_response, image_base)]
 
-    for source_record in source_records:
-        if source_record.identifier is not None:
-            process_record(source_record)
 
+def process_record(source_record, image_base: Optional[str] = None):
+    log.info(f'Processing {source_record.identifier}')
+    image_filenames = find_record_images(source_record, image_base)
+    images = lookup_images(source_record, image_filenames)
+    write_record(source_record, images)
+
+
+def find_record_images(source_record: SourceRecord, image_base: Optional[str] = None) -> List[str]:
+    """
+    List a record's image files
 
-def process_record(source_record):
+    :param source_record: SourceRecord the record
+    :param image_base: Optional[str] image file prefix; defaults to the record identifier
+    :return: List[str] the sorted image filenames
+    """
     # List the local image files, if requested. If they just provided SSH credentials, look
     # for the images on that server.
-    log.info(f'Processing {source_record.identifier}')
-
-    image_base = config.image_base if config.image_base else source_record.identifier
-    log.info(f'Globbing {config.ssh}{config.image_dir}/{image_base}...')
-    if remote_dir:
-        image_filenames = remote_dir.list_images(image_base)
+    image_base = image_base if image_base else source_record.identifier
+    log.info(f'Globbing {image_source}/{image_base}...')
+    if image_source:
+        with metrics.timer('list_images'):
+            image_filenames = image_source.list_images(image_base)
     else:
-        log.debug('No remote directory found')
-        # @todo get a list of files directly from Cantaloupe
+        log.debug('No image source found')
         image_filenames = []
     if len(image_filenames) == 0:
         raise Exception(f'Found no images for {image_base}')
 
     image_filenames.sort()
+    return image_filenames
+
+
+def lookup_images(source_record: SourceRecord, image_filenames: List[str]) -> List[Image]:
+    """
+    Build the images for a record, looking up their dimensions
+
+    :param source_record: SourceRecord the record
+    :param image_filenames: List[str] the record's image files
+    :return: List[Image] the images
+    """
+    if config.update:
+        reuse_dimensions(source_record.identifier, image_filenames)
     log.info(f'Found {len(image_filenames)} image files. Looking up dimensions...')
     images = []
-    for filename in image_filenames:
-        images.append(build_image(filename))
+    with metrics.timer('dimensions'):
+        for filename in image_filenames:
+            images.append(build_image(filename))
+    metrics.increment('images', len(images))
+    return images
+
+
+def write_record(source_record: SourceRecord, images: List[Image]) -> None:
+    """
+    Build and write a record's manifest, view and handle files
 
+    :param source_record: SourceRecord the record
+    :param images: List[Image] the record's images, with dimensions
+    :return: None
+    """
     handle_url = build_handle_url(source_record)
+    manifest_url = build_manifest_url(source_record)
 
     log.info(f'Found {source_record.identifier}. Building manifest...')
-    manifest = build_manifest(images, source_record, handle_url)
-    write_manifest_file(source_record.identifier, manifest)
+    with metrics.timer('build_manifest'):
+        manifest = build_manifest(images, source_record, handle_url, manifest_url)
+    manifest_status = write_manifest_file(source_record.identifier, manifest)
 
     log.info(f'Building view...')
     first_canvas = images[0].canvas_url
-    view = build_view(source_record.identifier, source_record, handle_url, first_canvas)
-    write_view_file(source_record.identifier, view)
+    with metrics.timer('build_view'):
+        view = build_view(source_record.identifier, source_record, handle_url, first_canvas, manifest_url)
+    view_status = write_view_file(source_record.identifier, view)
+
+    if config.prewarm:
+        warm_cache(images)
 
     log.info(f'Building handles...')
-    hdl_create_statements = [build_handles(source_record.identifier, config.handle_passwd)]
+    view_url = output_layout.view_url(source_record.identifier)
+    hdl_create_statements = [build_handles(source_record.identifier, config.handle_passwd, view_url)]
 
     log.info('Writing handle...')
-    write_hdl_batchfile(hdl_create_statements)
+    handle_path = write_hdl_batchfile(hdl_create_statements, source_record.identifier)
+    metrics.increment('records')
+
+    if catalog:
+        manifest_path = manifest_filename(source_record.identifier)
+        catalog.record({
+            'identifier': source_record.identifier,
+            'title': source_record.title,
+            'handle_url': handle_url,
+            'first_canvas': first_canvas,
+            'manifest_path': os.path.abspath(manifest_path),
+            'view_path': os.path.abspath(view_filename(source_record.identifier)),
+            'handle_path': os.path.abspath(handle_path),
+            'manifest_url': manifest_url,
+            'view_url': view_url,
+            'source_type': type(source_record).__name__,
+            'canvas_count': len(images),
+            'image_base': images[0].cui,
+            'content_hash': hash_index.get(manifest_path),
+            'image_stamps': json.dumps(image_stamps(images)),
+            'built_at': datetime.now().isoformat()
+        })
+
+    if manifest_status == ADDED:
+        status = ADDED
+    elif CHANGED in (manifest_status, view_status) or ADDED == view_status:
+        status = CHANGED
+    else:
+        status = UNCHANGED
+    changes[status].append(source_record.identifier)
+    log.info(f'{source_record.identifier} {status}')
 
 
 def read_marc_file(marc_file: str, identifier: Optional[str]) -> List[AlmaRecord]:
@@ -123,73 +379,407 @@ def read_marc_file(marc_file: str, identifier: Optional[str]) -> List[AlmaRecord
         return [AlmaRecord(source_record, identifier=identifier) for source_record in reader]
 
 
+def read_marcxml_file(marcxml_file: str, identifier: Optional[str]) -> Iterator[AlmaRecord]:
+    """
+    Stream the source records from a MARCXML file
+
+    :param marcxml_file: str full path to the MARCXML file
+    :param identifier: Optional[str] the records identifier; if None, the MMS will be used
+    :return: Iterator[AlmaRecord] the records in the file
+    """
+    for source_record in iter_records(marcxml_file):
+        yield AlmaRecord(source_record, identifier=identifier)
+
+
 def build_image(filename: str) -> Image:
     """
     Build a single image
 
-    :param filename: str the filename of the image
+    :param filename: str the filename of the image, under its shard in a sharded image directory
     :return: Image the image file
     """
-    image = Image(filename, config.iiif_base_url)
+    shard, _, filename = filename.rpartition('/')
+    image = Image(filename, config.iiif_base_url, shard if shard else None)
+
+    # Rows that share images share a single lookup.
+    image.width, image.height = dimension_cache.do(image.filename, lambda: lookup_dimensions(image))
+    log.info(f'{image.short_name} - {image.height}x{image.width}')
+    return image
+
+
+def lookup_dimensions(image: Image) -> tuple:
+    """
+    Get an image's dimensions from the image source, or else from the IIIF server
+
+    :param image: Image the image
+    :return: tuple (width, height)
+    """
+    dimensions = image_source.dimensions(image.path) if image_source else None
+    if dimensions:
+        return dimensions
 
     log.info(f'...fetching {image.info_url}')
+    start = perf_counter()
     r = http.request('GET', image.info_url)
+    metrics.observe('info_json_seconds', perf_counter() - start)
+    metrics.increment('http_requests')
+    metrics.increment('http_bytes_received', len(r.data))
     if r.status == 404:
         raise BadImageInfoURLError(
             f'Received 404 when looking up {image.info_url}. '
-            f'Make sure the permissions for {config.image_dir}/{image.filename} on scenery '
+            f'Make sure the permissions for {config.image_dir}/{image.path} on scenery '
             f'are set to 664 (read permission for all users).'
         )
     info = json.loads(r.data.decode('utf-8'))
-
-    image.height = info['height']
-    image.width = info['width']
-    log.info(f'{image.short_name} - {image.height}x{image.width}')
     sleep(.5)
-    return image
+    return info['width'], info['height']
+
+
+def image_stamps(images: List[Image]) -> dict:
+    """
+    The listed modification time and size of each image, to compare with on the next --update
+
+    :param images: List[Image] the record's images
+    :return: dict (mtime, size) by image filename
+    """
+    stamps = {}
+    for image in images:
+        stamp = image_source.stamp(image.path) if image_source else None
+        if stamp:
+            stamps[image.path] = stamp
+    return stamps
+
+
+def reuse_dimensions(identifier: str, image_filenames: List[str]) -> None:
+    """
+    Seed the dimension cache from an existing manifest
 
+    Only images that are new, or were replaced since the manifest was last built, will need to
+    be looked up. With a catalog, each image's modification time and size are compared with
+    those recorded at the last build; otherwise images modified after the manifest file are
+    looked up again.
 
-def write_view_file(identifier: str, view: str) -> None:
+    :param identifier: str the record identifier
+    :param image_filenames: List[str] the current image files
+    :return: None
+    """
+    filename = manifest_filename(identifier)
+    if not os.path.isfile(filename):
+        log.info(f'No existing manifest at {filename}; looking up every image')
+        return
+    with metrics.timer('read_existing_manifest'):
+        with open(filename) as fh:
+            known = read_dimensions(json.load(fh))
+    entry = catalog.get(identifier) if catalog else None
+    if entry and entry.image_stamps:
+        unchanged = set(image_source.unchanged(image_filenames, entry.image_stamps))
+    else:
+        # The manifest isn't rewritten when its content is the same, so this may be older
+        # than the last build.
+        unchanged = set(image_source.unchanged_since(image_filenames, os.path.getmtime(filename)))
+    reused = []
+    for image_filename in image_filenames:
+        # Dimensions are cached by file name, without any image directory shard.
+        name = image_filename.rsplit('/', 1)[-1]
+        if name not in known:
+            continue
+        if image_filename in unchanged:
+            dimension_cache.set(name, known[name])
+            reused.append(name)
+        else:
+            log.info(f'{image_filename} has changed since {identifier} was last built')
+            dimension_cache.forget(name)
+    metrics.increment('dimensions_reused', len(reused))
+    log.info(f'Reusing dimensions for {len(reused)} of {len(image_filenames)} images from {filename}')
+
+
+def warm_cache(images: List[Image]) -> None:
     """
-    Write a single view file
+    Have the IIIF server build the thumbnails and opening tiles before the handle is published
+
+    :param images: List[Image] the manifest's images
+    :return: None
+    """
+    urls = warm_urls(images, config.prewarm_pages)
+    log.info(f'Warming {len(urls)} IIIF derivatives...')
+    results = prewarm(urls, concurrency=config.prewarm_concurrency, rate=config.prewarm_rate)
+    latency = results['latency']
+    # An image counts as warmed once its thumbnail is; tiles are only fetched for the first pages.
+    failed = set(results['failed_urls'])
+    warmed = sum(1 for image in images if image.thumbnail_url not in failed)
+    log.info(f'Warmed {warmed} of {len(images)} images ({results["warmed"]} requests, {results["failed"]} failed); '
+             f'latency p50 {latency.get("p50", 0):.3f}s, p90 {latency.get("p90", 0):.3f}s, '
+             f'max {latency.get("max", 0):.3f}s')
+
+
+def write_view_file(identifier: str, view: str) -> str:
+    """
+    Write a single view file, unless it is unchanged
 
     :param identifier: str the identifier
     :param view: str the view file contents
-    :return: None
+    :return: str ADDED, CHANGED or UNCHANGED
     """
-    filename = f'{config.view_filename}' if config.view_filename else f'{identifier}.html'
-    fh = open(filename, 'w')
-    fh.write(view)
-    fh.close()
+    with metrics.timer('write_view', histogram='write_seconds'):
+        return write_text(view_filename(identifier), view, hash_index)
 
 
-def write_manifest_file(identifier: str, manifest: dict):
+def view_filename(identifier: str) -> str:
     """
-    Write the manifest to a file
+    The view file name for a record
+
+    :param identifier: str record identifier
+    :return: str
+    """
+    return f'{config.view_filename}' if config.view_filename else output_layout.path(identifier, '.html')
+
+
+def write_manifest_file(identifier: str, manifest: dict) -> str:
+    """
+    Write the manifest to a file, unless it is unchanged
     :param identifier: str record identifier
     :param manifest: dict the manifest values
-    :return:
+    :return: str ADDED, CHANGED or UNCHANGED
     """
-    filename = f'{config.manifest_filename}' if config.manifest_filename else f'{identifier}.json'
-    fh = open(filename, 'w')
-    fh.write(json.dumps(manifest))
-    fh.close()
+    filename = manifest_filename(identifier)
+    with metrics.timer('write_manifest', histogram='write_seconds'):
+        return write_json(filename, manifest, compact=config.compact, compress=config.compress,
+                          hash_index=hash_index)
 
 
-def write_hdl_batchfile(hdl_create_statements: List[str]):
+def manifest_filename(identifier: str) -> str:
+    """
+    The manifest file name for a record
+
+    :param identifier: str record identifier
+    :return: str
+    """
+    return f'{config.manifest_filename}' if config.manifest_filename else output_layout.path(identifier, '.json')
+
+
+def write_hdl_batchfile(hdl_create_statements: List[str], name: str) -> str:
     """
     Write the handle create statements to a file
+
+    Batch files are named for what they hold and timestamped to the microsecond, so records
+    built in the same second don't overwrite each other's.
+
     :param hdl_create_statements: list the list of handle create statements
-    :return:
+    :param name: str what the handles are for (e.g. the record identifier)
+    :return: str the batch file name
     """
-    hdl_file_title = datetime.now().strftime("%m-%d-%Y-%H-%M-%S")
-    fh = open(f'handles-{hdl_file_title}-hdl.txt', 'w')
+    hdl_file_title = datetime.now().strftime("%m-%d-%Y-%H-%M-%S-%f")
     all_hdl_create_statements = '\n'.join(hdl_create_statements)
-    fh.write(all_hdl_create_statements)
-    fh.close()
+    filename = f'handles-{name}-{hdl_file_title}-hdl.txt'
+    _write_file(filename, all_hdl_create_statements)
+    return filename
+
+
+def _write_file(filename: str, contents: str) -> None:
+    """
+    Write a text output file, recording timing and byte counts
+
+    :param filename: str the file to write
+    :param contents: str the file contents
+    """
+    with metrics.timer('write_files', histogram='write_seconds'):
+        with open(filename, 'w') as fh:
+            fh.write(contents)
+    metrics.increment('files_written')
+    metrics.increment('bytes_written', len(contents.encode('utf-8')))
+
+
+def watch() -> None:
+    """
+    Wait for each record's images to finish uploading, then build its outputs
+
+    :return: None
+    """
+    check_requirements()
+    if not image_source:
+        raise Exception('Watch mode needs an image source (--ssh, --local or --inventory)')
+
+    records = {}
+    for source_record in load_records(config.source_record, config.image_base):
+        if source_record.identifier is not None:
+            image_base = config.image_base if config.image_base else source_record.identifier
+            records[image_base] = source_record
+
+    def collect_dimensions(filename: str) -> None:
+        image_source.fix_permissions([filename])
+        build_image(filename)
+
+    def build_ready(image_base: str, filenames: List[str]) -> None:
+        # Failures propagate, so the watcher tries the sequence again.
+        process_record(records[image_base], image_base)
+
+    log.info(f'Watching {image_source} for {len(records)} image sequences...')
+    watcher = SequenceWatcher(image_source, list(records.keys()), config.quiet_period,
+                              collect_dimensions, build_ready)
+    watcher.watch(config.poll_interval)
+
+
+def regenerate() -> None:
+    """
+    Rebuild view or handle files for catalogued manifests, without the source records or images
+
+    :return: None
+    """
+    check_requirements()
+    if not catalog:
+        raise Exception('Regenerating needs a catalog (--catalog)')
+    entries = catalog.query(parse_selection(config.select))
+    log.info(f'Regenerating {config.regenerate} for {len(entries)} manifests')
+
+    if config.regenerate == 'views':
+        for entry in entries:
+            view = build_view(entry.identifier, entry, entry.handle_url, entry.first_canvas, entry.manifest_url)
+            with metrics.timer('write_view', histogram='write_seconds'):
+                status = write_text(entry.view_path, view, hash_index)
+            changes[status].append(entry.identifier)
+    elif config.regenerate == 'handles':
+        hdl_create_statements = [build_handles(entry.identifier, config.handle_passwd, entry.view_url)
+                                 for entry in entries]
+        filename = write_hdl_batchfile(hdl_create_statements, 'regenerated')
+        log.info(f'Wrote {len(hdl_create_statements)} handles to {filename}')
+
+
+def migrate_layout() -> None:
+    """
+    Move a flat output directory into the sharded layout, once
+
+    Writes the old and new URLs of everything moved to layout-redirects.tsv in the
+    directory, for web server redirects, and updates the catalog.
+
+    :return: None
+    """
+    if not output_layout.sharded:
+        raise Exception('Migrating needs a sharded layout (--layout hash or --layout prefix)')
+    directory = config.migrate_layout
+    log.info(f'Moving {directory} into the {output_layout.scheme} layout')
+    with metrics.timer('migrate_layout'):
+        redirects = migrate(directory, output_layout, hash_index)
+
+    redirects_filename = os.path.join(directory, 'layout-redirects.tsv')
+    with open(redirects_filename, 'a') as fh:
+        fh.writelines(f'{old_url}\t{new_url}\n' for old_url, new_url in redirects)
+    log.info(f'Moved {len(redirects)} files; wrote redirects to {redirects_filename}')
+
+    if catalog:
+        flat_directory = os.path.abspath(directory)
+        for entry in catalog.query():
+            if os.path.dirname(entry.manifest_path or '') != flat_directory:
+                continue
+            manifest_path = os.path.abspath(output_layout.path(entry.identifier, '.json', directory))
+            catalog.update(entry.identifier, {
+                'manifest_path': manifest_path,
+                'view_path': os.path.abspath(output_layout.path(entry.identifier, '.html', directory)),
+                'manifest_url': output_layout.manifest_url(entry.identifier),
+                'view_url': output_layout.view_url(entry.identifier),
+                # The manifest's @id was rewritten, so its content changed.
+                'content_hash': hash_index.get(manifest_path)
+            })
+
+
+def serve() -> None:
+    """
+    Run as a long-running service, keeping connections and caches warm between jobs
+
+    :return: None
+    """
+    check_requirements()
+    job_service = service.ManifestService(run_job, workers=config.workers, queue_size=config.queue_size,
+                                          clear_caches=clear_caches)
+    job_service.serve(config.serve)
+
+
+def run_job(request: dict) -> None:
+    """
+    Run a single service job
+
+    :param request: dict the job request, with a source_record and optional image_base
+    :return: None
+    """
+    # Pick up newly uploaded images.
+    if image_source:
+        refresh_images(config.index_ttl)
+
+    image_base = request.get('image_base')
+    for source_record in load_records(request['source_record'], image_base):
+        if source_record.identifier is not None:
+            process_record(source_record, image_base)
+
+
+def submit_job() -> None:
+    """
+    Submit the source record to a running service
+
+    :return: None
+    """
+    source = config.source_record
+    if os.path.exists(source):
+        # The service may not share our working directory.
+        source = os.path.abspath(source)
+    job = service.request(config.submit, 'POST', '/jobs',
+                          {'source_record': source, 'image_base': config.image_base})
+    print(json.dumps(job, indent=2))
+
+
+def clear_caches() -> None:
+    """
+    Forget cached image dimensions and ASpace records
+
+    :return: None
+    """
+    dimension_cache.clear()
+    aspace_client.clear_cache()
+    if image_source:
+        refresh_images()
+
 
+def refresh_images(max_age: Optional[float] = None) -> None:
+    """
+    Re-list the image source, one refresh at a time
+
+    Jobs running meanwhile keep using the old listing until the new one is swapped in.
+
+    :param max_age: Optional[float] only refresh a listing older than this many seconds
+    :return: None
+    """
+    with refresh_lock:
+        # Another job may have refreshed it while this one waited.
+        if max_age is None or image_source.age() > max_age:
+            image_source.refresh()
+
+
+def write_change_list() -> None:
+    """
+    Write the identifiers that were added, changed and unchanged, if requested
+
+    :return: None
+    """
+    log.info(f'{len(changes[ADDED])} added, {len(changes[CHANGED])} changed, {len(changes[UNCHANGED])} unchanged')
+    if config.changes:
+        with open(config.changes, 'w') as fh:
+            json.dump(changes, fh, indent=2)
+        log.info(f'Wrote change list to {config.changes}')
 
-def build_view(identifier: str, record: object, handle_url: str, first_canvas: str):
+
+def write_metrics() -> None:
+    """
+    Write the run report and Prometheus textfile, if requested
+
+    :return: None
+    """
+    if config.report:
+        metrics.write_report(config.report)
+        log.info(f'Wrote run report to {config.report}')
+    if config.prometheus:
+        metrics.write_prometheus(config.prometheus)
+        log.info(f'Wrote Prometheus metrics to {config.prometheus}')
+
+
+def build_view(identifier: str, record: object, handle_url: str, first_canvas: str, manifest_url: str):
     """
     Build view file text
 
@@ -197,6 +787,7 @@ def build_view(identifier: str, record: object, handle_url: str, first_canvas: s
     :param record: object the MARC record
     :param first_canvas: str the Canvas of the first image
     :param handle_url: str the full URL of the handle
+    :param manifest_url: str the full URL of the manifest
     :return:str the text of the view file
     """
     # Build from an HTML template.
@@ -206,15 +797,17 @@ def build_view(identifier: str, record: object, handle_url: str, first_canvas: s
     html = html.replace('__RECORD_IDENTIFIER__', identifier)
     html = html.replace('__HANDLE_URL__', handle_url)
     html = html.replace('__FIRST_CANVAS__', first_canvas)
+    html = html.replace('__MANIFEST_URL__', manifest_url)
     return html
 
 
-def build_handles(identifier: str, hdl_password: str):
+def build_handles(identifier: str, hdl_password: str, view_url: str):
     """
     Build Handle bulk file
 
     :param identifier: str the identifier
     :param hdl_password: str the Handle server password
+    :param view_url: str the full URL of the view the handle points to
     :param mms: str the MMS number of the MARC record
     :return: str the text of the Hanlde bulk file
     """
@@ -223,6 +816,7 @@ def build_handles(identifier: str, hdl_password: str):
         hdl_text = fh.read()
     hdl_text = hdl_text.replace('__RECORD_IDENTIFIER__', identifier)
     hdl_text = hdl_text.replace('__HANDLE_PASSWORD__', hdl_password)
+    hdl_text = hdl_text.replace('__VIEW_URL__', view_url)
     return hdl_text
 
 
@@ -232,6 +826,12 @@ def build_handle_url(source_record: SourceRecord) -> str:
     return source_record.handle_url
 
 
+def build_manifest_url(source_record: SourceRecord) -> str:
+    if output_layout.sharded:
+        return output_layout.manifest_url(source_record.identifier)
+    return source_record.manifest_url
+
+
 def check_requirements():
     """
     Throw an error if something is amiss
@@ -251,6 +851,11 @@ def check_requirements():
     else:
         log.info(f'Found {src_path}/view-template.html')
 
+    check_compression(config.compress)
+
+    if config.alma and not config.alma_api_key:
+        raise Exception('Set ALMA_API_KEY in .env to fetch records from Alma')
+
     if not os.path.isfile(f'{src_path}/handle-template.txt'):
         raise Exception(f'{src_path}/handle-template.txt not found')
     else:
@@ -0,0 +1,60 @@
+import xml.etree.ElementTree as ET
+from typing import Iterator
+
+from pymarc import Field, Indicators, Leader, Record
+
+
+def record_from_element(element: ET.Element) -> Record:
+    """
+    Build a MARC record from a MARCXML <record> element
+
+    Works with or without the MARC21 slim namespace (Alma API responses leave it off).
+
+    :param element: ET.Element the <record> element
+    :return: Record the MARC record
+    """
+    record = Record()
+    for child in element:
+        name = local_name(child.tag)
+        if name == 'leader':
+            record.leader = Leader(child.text or '')
+        elif name == 'controlfield':
+            record.add_field(Field(child.get('tag'), data=child.text or ''))
+        elif name == 'datafield':
+            field = Field(child.get('tag'), Indicators(child.get('ind1', ' '), child.get('ind2', ' ')))
+            for subfield in child:
+                if local_name(subfield.tag) == 'subfield':
+                    field.add_subfield(subfield.get('code'), subfield.text or '')
+            record.add_field(field)
+    return record
+
+
+def local_name(tag: str) -> str:
+    """
+    Strip the namespace from an element tag
+
+    :param tag: str e.g. '{http://www.loc.gov/MARC21/slim}record'
+    :return: str e.g. 'record'
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_records(marcxml_file: str) -> Iterator[Record]:
+    """
+    Stream the records out of a MARCXML file
+
+    Each <record> element is cleared once it has been converted, so memory use stays flat
+    no matter how many records the collection holds.
+
+    :param marcxml_file: str path to the MARCXML file
+    :return: Iterator[Record] the MARC records
+    """
+    root = None
+    for event, element in ET.iterparse(marcxml_file, events=('start', 'end')):
+        if root is None:
+            root = element
+        if event == 'end' and local_name(element.tag) == 'record':
+            yield record_from_element(element)
+            element.clear()
+            # Drop the emptied element from the collection too.
+            root.clear()
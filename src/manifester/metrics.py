@@ -0,0 +1,192 @@
+"""
+Run metrics: stage timers, counters and latency histograms
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+# Upper bounds (in seconds) of the buckets used when exporting latency histograms.
+buckets = [.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0]
+
+
+class Metrics:
+    """
+    Collects timing and I/O metrics for a single run
+
+    Attributes:
+        stages (dict): total seconds and call count for each named stage
+        counters (dict): running totals (e.g. 'http_requests', 'bytes_written')
+        histograms (dict): lists of observed latencies in seconds
+    """
+    stages: dict
+    counters: dict
+    histograms: dict
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.histograms = {}
+
+    @contextmanager
+    def timer(self, stage: str, histogram: Optional[str] = None):
+        """
+        Time a block of code
+
+        :param stage: str the name of the stage to add the elapsed time to
+        :param histogram: Optional[str] also record the elapsed time in this histogram
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                totals = self.stages.setdefault(stage, {'seconds': 0.0, 'count': 0})
+                totals['seconds'] += elapsed
+                totals['count'] += 1
+                if histogram:
+                    self.histograms.setdefault(histogram, []).append(elapsed)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """
+        Add to a counter
+
+        :param counter: str the counter name
+        :param amount: int how much to add
+        """
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def observe(self, histogram: str, seconds: float) -> None:
+        """
+        Record a single latency
+
+        :param histogram: str the histogram name
+        :param seconds: float the observed latency
+        """
+        with self._lock:
+            self.histograms.setdefault(histogram, []).append(seconds)
+
+    def summary(self, histogram: str) -> dict:
+        """
+        Summarize a latency histogram
+
+        :param histogram: str the histogram name
+        :return: dict count, total, min, max and percentiles of the observed values
+        """
+        with self._lock:
+            values = sorted(self.histograms.get(histogram, []))
+        if not values:
+            return {'count': 0, 'sum': 0.0}
+        return {
+            'count': len(values),
+            'sum': sum(values),
+            'min': values[0],
+            'max': values[-1],
+            'p50': _percentile(values, 50),
+            'p90': _percentile(values, 90),
+            'p99': _percentile(values, 99)
+        }
+
+    def report(self) -> dict:
+        """
+        Build the machine-readable run report
+
+        :return: dict the report
+        """
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self.stages.items()}
+            counters = dict(self.counters)
+            histogram_names = list(self.histograms.keys())
+        return {
+            'started': self.started.isoformat(),
+            'elapsed': time.perf_counter() - self._start,
+            'stages': stages,
+            'counters': counters,
+            'histograms': {name: self.summary(name) for name in histogram_names}
+        }
+
+    def write_report(self, filename: str) -> None:
+        """
+        Write the run report as JSON
+
+        :param filename: str the report file name
+        """
+        with open(filename, 'w') as fh:
+            json.dump(self.report(), fh, indent=2)
+
+    def prometheus(self) -> str:
+        """
+        Format the metrics in the Prometheus text exposition format
+
+        :return: str the metrics text
+        """
+        report = self.report()
+        lines = [
+            '# TYPE manifester_run_seconds gauge',
+            f'manifester_run_seconds {report["elapsed"]}'
+        ]
+
+        lines.append('# TYPE manifester_stage_seconds_total counter')
+        for stage, totals in report['stages'].items():
+            lines.append(f'manifester_stage_seconds_total{{stage="{stage}"}} {totals["seconds"]}')
+        lines.append('# TYPE manifester_stage_calls_total counter')
+        for stage, totals in report['stages'].items():
+            lines.append(f'manifester_stage_calls_total{{stage="{stage}"}} {totals["count"]}')
+
+        for counter, value in report['counters'].items():
+            name = f'manifester_{_metric_name(counter)}_total'
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name} {value}')
+
+        with self._lock:
+            histograms = {name: list(values) for name, values in self.histograms.items()}
+        for histogram, values in histograms.items():
+            name = f'manifester_{_metric_name(histogram)}'
+            lines.append(f'# TYPE {name} histogram')
+            for bound in buckets:
+                count = len([value for value in values if value <= bound])
+                lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {len(values)}')
+            lines.append(f'{name}_sum {sum(values)}')
+            lines.append(f'{name}_count {len(values)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, filename: str) -> None:
+        """
+        Write the metrics in the Prometheus textfile collector format
+
+        The file is written to a temporary name and then renamed, so the collector never
+        reads a partial file.
+
+        :param filename: str the .prom file name
+        """
+        tmp_filename = f'{filename}.tmp'
+        with open(tmp_filename, 'w') as fh:
+            fh.write(self.prometheus())
+        os.replace(tmp_filename, filename)
+
+
+def _percentile(values: list[float], percent: int) -> float:
+    """
+    Nearest-rank percentile of a sorted list
+    """
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[index]
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+# Metrics for the current run.
+metrics = Metrics()
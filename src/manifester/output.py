@@ -0,0 +1,247 @@
+"""
+Write output files, optionally with pre-compressed copies for static serving
+
+Files whose content hasn't changed are left untouched, so their modification times (and
+downstream syncs) only change when the content does.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Iterable, Iterator, Optional
+
+from manifester.metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Supported pre-compressed formats and their file extensions.
+compression_formats = {
+    'gzip': '.gz',
+    'br': '.br'
+}
+
+# Encoded JSON is collected into chunks of about this many bytes before being written.
+chunk_size = 64 * 1024
+
+# Results of a write.
+ADDED = 'added'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+
+class HashIndex:
+    """
+    Content hashes of previously written files
+
+    Saves re-reading existing files to find out whether they've changed. Without an
+    index file, hashes are kept for the current run only.
+    """
+    filename: Optional[str]
+    hashes: dict
+
+    def __init__(self, filename: Optional[str] = None):
+        """
+        Constructor
+
+        :param filename: Optional[str] JSON file to load the index from and save it to
+        """
+        self.filename = filename
+        self.hashes = {}
+        self._lock = threading.Lock()
+        if filename and os.path.isfile(filename):
+            with open(filename) as fh:
+                self.hashes = json.load(fh)
+
+    def get(self, path: str) -> Optional[str]:
+        with self._lock:
+            return self.hashes.get(os.path.abspath(path))
+
+    def set(self, path: str, digest: str) -> None:
+        with self._lock:
+            self.hashes[os.path.abspath(path)] = digest
+
+    def forget(self, path: str) -> None:
+        with self._lock:
+            self.hashes.pop(os.path.abspath(path), None)
+
+    def save(self) -> None:
+        """
+        Write the index file, if there is one
+        """
+        if not self.filename:
+            return
+        with self._lock:
+            hashes = dict(self.hashes)
+        tmp_filename = f'{self.filename}.tmp'
+        with open(tmp_filename, 'w') as fh:
+            json.dump(hashes, fh, indent=1, sort_keys=True)
+        os.replace(tmp_filename, self.filename)
+
+
+def write_json(filename: str, data: dict, compact: bool = False, compress: Iterable[str] = (),
+               hash_index: Optional[HashIndex] = None) -> str:
+    """
+    Serialize JSON to a file and to compressed copies next to it
+
+    The JSON is compressed and hashed as it is encoded, so the full text is never held in
+    memory. Each file is written under a temporary name and renamed when complete, unless
+    the content is the same as the existing file.
+
+    :param filename: str the JSON file name (e.g. 'bc-2022-172.json')
+    :param data: dict the data to serialize
+    :param compact: bool leave out all optional whitespace
+    :param compress: Iterable[str] compressed copies to write ('gzip', 'br')
+    :param hash_index: Optional[HashIndex] hashes of existing files
+    :return: str ADDED, CHANGED or UNCHANGED
+    """
+    encoder = json.JSONEncoder(separators=(',', ':')) if compact else json.JSONEncoder()
+    return _write(filename, _chunks(encoder.iterencode(data)), compress, hash_index)
+
+
+def write_text(filename: str, text: str, hash_index: Optional[HashIndex] = None, compress: Iterable[str] = ()) -> str:
+    """
+    Write a text file, unless the content is the same as the existing file
+
+    :param filename: str the file name
+    :param text: str the contents
+    :param hash_index: Optional[HashIndex] hashes of existing files
+    :param compress: Iterable[str] compressed copies to write ('gzip', 'br')
+    :return: str ADDED, CHANGED or UNCHANGED
+    """
+    return _write(filename, [text.encode('utf-8')], compress, hash_index)
+
+
+def file_digest(filename: str) -> str:
+    """
+    SHA-256 of a file's contents
+
+    :param filename: str the file
+    :return: str hex digest
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as fh:
+        for block in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write(filename: str, chunks: Iterable[bytes], compress: Iterable[str], hash_index: Optional[HashIndex]) -> str:
+    compress = list(compress)
+    check_compression(compress)
+    hash_index = hash_index if hash_index else HashIndex()
+    directory = os.path.dirname(filename)
+    if directory:
+        # Sharded layouts write into subdirectories.
+        os.makedirs(directory, exist_ok=True)
+    sinks = [_FileSink(filename)] + [_FileSink(f'{filename}{compression_formats[name]}', name) for name in compress]
+    digest = hashlib.sha256()
+    try:
+        for chunk in chunks:
+            digest.update(chunk)
+            _write_all(sinks, chunk)
+    except BaseException:
+        for sink in sinks:
+            sink.abort()
+        raise
+
+    # Leave the existing files alone if nothing has changed.
+    existed = os.path.isfile(filename)
+    if existed and all(os.path.isfile(sink.filename) for sink in sinks):
+        previous = hash_index.get(filename) or file_digest(filename)
+        if previous == digest.hexdigest():
+            for sink in sinks:
+                sink.abort()
+            hash_index.set(filename, previous)
+            metrics.increment('files_unchanged')
+            return UNCHANGED
+
+    for sink in sinks:
+        sink.close()
+    hash_index.set(filename, digest.hexdigest())
+    return CHANGED if existed else ADDED
+
+
+def _chunks(pieces: Iterator[str]) -> Iterator[bytes]:
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            buffered = 0
+    yield ''.join(buffer).encode('utf-8')
+
+
+def check_compression(compress: Iterable[str]) -> None:
+    """
+    Throw an error if a compression format can't be written
+
+    :param compress: Iterable[str] requested compression formats
+    :return: None
+    """
+    for name in compress:
+        if name not in compression_formats:
+            raise ValueError(f'Unknown compression format {name}')
+        if name == 'br' and brotli is None:
+            raise Exception('Brotli output requires the brotli package (pip install manifester[brotli])')
+
+
+def _write_all(sinks: list, data: bytes) -> None:
+    for sink in sinks:
+        sink.write(data)
+
+
+class _FileSink:
+    """
+    A file being written, possibly through a compressor
+    """
+    def __init__(self, filename: str, compression: str = None):
+        self.filename = filename
+        self.compression = compression
+        self.tmp_filename = f'{filename}.tmp'
+        self.fh = open(self.tmp_filename, 'wb')
+        self.written = 0
+        self.gzip = None
+        self.brotli = None
+        if compression == 'gzip':
+            # A fixed mtime keeps the output identical for identical input.
+            self.gzip = gzip.GzipFile(filename='', mode='wb', fileobj=self.fh, compresslevel=9, mtime=0)
+        elif compression == 'br':
+            self.brotli = brotli.Compressor(mode=brotli.MODE_TEXT)
+
+    def write(self, data: bytes) -> None:
+        if self.gzip:
+            self.gzip.write(data)
+        elif self.brotli:
+            self._write_file(self.brotli.process(data))
+        else:
+            self._write_file(data)
+
+    def close(self) -> None:
+        if self.gzip:
+            self.gzip.close()
+            self.written = self.fh.tell()
+        elif self.brotli:
+            self._write_file(self.brotli.finish())
+        self.fh.close()
+        os.replace(self.tmp_filename, self.filename)
+        metrics.increment('files_written')
+        metrics.increment('bytes_written', self.written)
+        if self.compression:
+            metrics.increment(f'{self.compression}_bytes_written', self.written)
+
+    def abort(self) -> None:
+        self.gzip = None
+        self.fh.close()
+        if os.path.exists(self.tmp_filename):
+            os.remove(self.tmp_filename)
+
+    def _write_file(self, data: bytes) -> None:
+        self.fh.write(data)
+        self.written += len(data)
@@ -0,0 +1,127 @@
+"""
+Staged pipeline that overlaps the I/O of consecutive records
+
+Each stage runs its (blocking) function in worker threads, up to its concurrency limit, and
+hands results to the next stage through a bounded queue, so a slow stage holds back the
+stages before it. Stages marked `ordered` see items in input order. Only a window of items
+is let in ahead of the first ordered stage, so a slow item can't leave the rest of the input
+piling up behind it.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Iterable
+
+from manifester.metrics import metrics
+
+# Marks the end of a stage's input.
+_done = object()
+
+
+class Stage:
+    """
+    A single pipeline stage
+
+    Attributes:
+        name (str): used in logs and metrics
+        function (Callable): called with the previous stage's result
+        concurrency (int): the number of items processed at once
+        ordered (bool): process items in input order (forces a concurrency of 1)
+    """
+    name: str
+    function: Callable[[Any], Any]
+    concurrency: int
+    ordered: bool
+
+    def __init__(self, name: str, function: Callable[[Any], Any], concurrency: int = 1, ordered: bool = False):
+        self.name = name
+        self.function = function
+        self.ordered = ordered
+        self.concurrency = 1 if ordered else max(1, concurrency)
+
+
+def run_pipeline(items: Iterable, stages: list[Stage], queue_size: int = 2) -> list:
+    """
+    Run items through the stages
+
+    :param items: Iterable the inputs to the first stage
+    :param stages: list[Stage] the stages, in order
+    :param queue_size: int the maximum number of items waiting between two stages
+    :return: list the results of the last stage, in input order
+    """
+    return asyncio.run(_run(items, stages, queue_size))
+
+
+async def _run(items: Iterable, stages: list[Stage], queue_size: int) -> list:
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+    results = {}
+
+    # Items are let in as the first ordered stage (or the last stage) passes them on. The
+    # window is enough to keep every worker up to it busy, but bounds the reorder buffer.
+    ordered = [index for index, stage in enumerate(stages) if stage.ordered]
+    release_index = ordered[0] if ordered else len(stages) - 1
+    window = asyncio.Semaphore(queue_size + sum(stage.concurrency for stage in stages[:release_index + 1]))
+
+    async def feed():
+        iterator = iter(items)
+        sequence = 0
+        while True:
+            await window.acquire()
+            # Reading the input may block (e.g. parsing records), so keep it off the event loop.
+            item = await asyncio.to_thread(next, iterator, _done)
+            if item is _done:
+                break
+            await queues[0].put((sequence, item))
+            sequence += 1
+        for _ in range(stages[0].concurrency):
+            await queues[0].put(_done)
+
+    async def work(index: int, stage: Stage, finished: list):
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        waiting = {}
+        next_sequence = 0
+        while True:
+            entry = await inbox.get()
+            if entry is _done:
+                break
+            if stage.ordered:
+                # Hold items that arrive early until their turn comes.
+                waiting[entry[0]] = entry[1]
+                ready = []
+                while next_sequence in waiting:
+                    ready.append((next_sequence, waiting.pop(next_sequence)))
+                    next_sequence += 1
+            else:
+                ready = [entry]
+            for sequence, item in ready:
+                with metrics.timer(f'pipeline_{stage.name}'):
+                    result = await asyncio.to_thread(stage.function, item)
+                if outbox:
+                    await outbox.put((sequence, result))
+                else:
+                    results[sequence] = result
+                if index == release_index:
+                    window.release()
+
+        # The last worker out tells the next stage there is nothing more to come.
+        finished[0] += 1
+        if outbox and finished[0] == stage.concurrency:
+            for _ in range(stages[index + 1].concurrency):
+                await outbox.put(_done)
+
+    tasks = [asyncio.create_task(feed())]
+    for index, stage in enumerate(stages):
+        finished = [0]
+        for _ in range(stage.concurrency):
+            tasks.append(asyncio.create_task(work(index, stage, finished)))
+
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        logging.error('Pipeline stage failed; stopping')
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    return [results[sequence] for sequence in sorted(results)]
@@ -0,0 +1,163 @@
+"""
+Check a batch before doing any expensive I/O
+"""
+from typing import Iterable, Optional
+
+from manifester.image_source import ImageSource, sequence_gaps
+from manifester.source_record import SourceRecord
+
+# Source record properties the manifest, view and handle builds read.
+required_fields = ['identifier', 'title', 'handle_url', 'manifest_url', 'citation', 'attribution']
+
+# Fields that must have a value, not just be readable. The record's handle URL must too,
+# unless one is given for the whole batch.
+non_empty_fields = ['title']
+
+# Seconds build_image waits after each info.json request.
+lookup_delay = .5
+
+
+class PlanEntry:
+    """
+    The plan for a single record
+    """
+    identifier: str
+    image_base: str
+    resolved_base: Optional[str]
+    image_count: int
+    problems: list
+
+    def __init__(self, identifier: str, image_base: str):
+        self.identifier = identifier
+        self.image_base = image_base
+        self.resolved_base = None
+        self.image_count = 0
+        self.problems = []
+
+
+class Plan:
+    """
+    What a batch will do, and what will stop it
+
+    Attributes:
+        entries (list[PlanEntry]): one per record with an identifier
+        skipped (int): records with no identifier, which the run skips
+        estimates (dict): expected request and write counts
+    """
+    entries: list
+    skipped: int
+    estimates: dict
+
+    def __init__(self):
+        self.entries = []
+        self.skipped = 0
+        self.estimates = {}
+
+    @property
+    def problems(self) -> list[str]:
+        return [f'{entry.identifier}: {problem}' for entry in self.entries for problem in entry.problems]
+
+    @property
+    def ok(self) -> bool:
+        return len(self.problems) == 0
+
+    def report(self) -> str:
+        """
+        Format the plan for people
+
+        :return: str the plan
+        """
+        lines = [f'{"identifier":<30} {"image base":<30} {"images":>7}  status']
+        for entry in self.entries:
+            status = '; '.join(entry.problems) if entry.problems else 'ok'
+            lines.append(f'{entry.identifier:<30} {entry.resolved_base or entry.image_base:<30} '
+                         f'{entry.image_count:>7}  {status}')
+        lines.append('')
+        if self.skipped:
+            lines.append(f'{self.skipped} records with no identifier will be skipped')
+        for name, value in self.estimates.items():
+            lines.append(f'{name.replace("_", " ")}: {value}')
+        lines.append(f'{len(self.problems)} problems found')
+        return '\n'.join(lines)
+
+
+def plan(records: Iterable[SourceRecord], image_source: Optional[ImageSource], image_base: Optional[str] = None,
+         outputs_per_record: int = 3, handle_url: Optional[str] = None) -> Plan:
+    """
+    Check every record against the image listing before any lookups or writes
+
+    :param records: Iterable[SourceRecord] the batch
+    :param image_source: Optional[ImageSource] where the images are; its listing is used as-is
+    :param image_base: Optional[str] image file prefix for every record; defaults to each identifier
+    :param outputs_per_record: int files written for each record
+    :param handle_url: Optional[str] handle URL for every record; defaults to each record's own
+    :return: Plan the plan
+    """
+    batch_plan = Plan()
+    non_empty = non_empty_fields if handle_url else non_empty_fields + ['handle_url']
+    seen = {}
+    resolved_bases = set()
+    filenames = set()
+
+    for record in records:
+        try:
+            identifier = record.identifier
+        except Exception as e:
+            entry = PlanEntry('?', image_base or '?')
+            entry.problems.append(f'identifier: {type(e).__name__} {e}'.strip())
+            batch_plan.entries.append(entry)
+            continue
+        if identifier is None:
+            batch_plan.skipped += 1
+            continue
+
+        entry = PlanEntry(identifier, image_base if image_base else identifier)
+        batch_plan.entries.append(entry)
+
+        if identifier in seen:
+            entry.problems.append(f'duplicate of record {seen[identifier]}')
+        seen.setdefault(identifier, len(batch_plan.entries))
+
+        entry.problems.extend(_field_problems(record, non_empty))
+
+        image_files = []
+        if image_source:
+            entry.resolved_base, image_files = image_source.resolve(entry.image_base)
+        entry.image_count = len(image_files)
+        if not image_files:
+            entry.problems.append(f'found no images for {entry.image_base}')
+            continue
+        gaps = sequence_gaps(image_files)
+        if gaps:
+            entry.problems.append(f'missing counters {", ".join(str(gap) for gap in gaps)}')
+
+        resolved_bases.add(entry.resolved_base)
+        filenames.update(image_files)
+
+    records_to_build = len(batch_plan.entries)
+    known = image_source is not None and image_source.knows_dimensions
+    info_requests = 0 if known else len(filenames)
+    batch_plan.estimates = {
+        'records': records_to_build,
+        'images': sum(entry.image_count for entry in batch_plan.entries),
+        'unique_images': len(filenames),
+        'image_bases_listed': len(resolved_bases),
+        'permission_checks': len(filenames),
+        'info_json_requests': info_requests,
+        'estimated_lookup_seconds': info_requests * lookup_delay,
+        'files_written': records_to_build * outputs_per_record
+    }
+    return batch_plan
+
+
+def _field_problems(record: SourceRecord, non_empty: list[str]) -> list[str]:
+    problems = []
+    for field in required_fields:
+        try:
+            value = getattr(record, field)
+        except Exception as e:
+            problems.append(f'{field}: {type(e).__name__} {e}'.strip())
+            continue
+        if field in non_empty and not value:
+            problems.append(f'missing {field}')
+    return problems
@@ -0,0 +1,124 @@
+"""
+Warm the IIIF server's derivative cache for newly built manifests
+"""
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import urllib3
+
+from manifester.image import Image
+from manifester.metrics import Metrics, metrics
+
+# Cantaloupe's default tile size.
+tile_size = 512
+
+# Viewers fit the opening page to a viewport of about this many pixels.
+viewport = 1024
+
+
+def warm_urls(images: list[Image], pages: int) -> list[str]:
+    """
+    URLs a viewer requests when first opening a manifest
+
+    Every canvas's thumbnail, plus the tiles for the first few pages at the scale that fits
+    the viewport.
+
+    :param images: list[Image] the manifest's images, with dimensions
+    :param pages: int the number of opening pages to fetch tiles for
+    :return: list[str] the URLs
+    """
+    urls = [image.thumbnail_url for image in images]
+    for image in images[:pages]:
+        urls.extend(tile_urls(image))
+    return urls
+
+
+def tile_urls(image: Image) -> list[str]:
+    """
+    IIIF Image API 2 tile URLs covering an image at the scale that fits the viewport
+
+    :param image: Image the image, with dimensions
+    :return: list[str] the URLs
+    """
+    width = int(image.width)
+    height = int(image.height)
+    scale = 1
+    while max(width, height) / scale > viewport:
+        scale *= 2
+
+    region = tile_size * scale
+    urls = []
+    for y in range(0, height, region):
+        for x in range(0, width, region):
+            region_width = min(region, width - x)
+            region_height = min(region, height - y)
+            size = math.ceil(region_width / scale)
+            urls.append(f'{image.image_url}/{x},{y},{region_width},{region_height}/{size},/0/default.jpg')
+    return urls
+
+
+def prewarm(urls: list[str], concurrency: int = 4, rate: float = 10,
+            http: Optional[urllib3.PoolManager] = None) -> dict:
+    """
+    Request each URL from the IIIF server
+
+    :param urls: list[str] the URLs to request
+    :param concurrency: int the number of requests in flight at once
+    :param rate: float the maximum number of requests started per second
+    :param http: Optional[urllib3.PoolManager] connection pool to use
+    :return: dict the number of URLs warmed and failed, the failed URLs, and the latency distribution
+    """
+    http = http if http else urllib3.PoolManager(maxsize=concurrency)
+    limiter = _RateLimiter(rate)
+    results = {'warmed': 0, 'failed': 0, 'failed_urls': []}
+    latencies = Metrics()
+    lock = threading.Lock()
+
+    def warm(url: str) -> None:
+        limiter.wait()
+        start = time.perf_counter()
+        try:
+            response = http.request('GET', url, preload_content=False)
+            response.drain_conn()
+            ok = response.status == 200
+            response.release_conn()
+        except urllib3.exceptions.HTTPError as e:
+            logging.warning(f'Could not warm {url}: {e}')
+            ok = False
+        latency = time.perf_counter() - start
+        latencies.observe('prewarm_seconds', latency)
+        metrics.observe('prewarm_seconds', latency)
+        metrics.increment('http_requests')
+        with lock:
+            results['warmed' if ok else 'failed'] += 1
+            if not ok:
+                results['failed_urls'].append(url)
+
+    with metrics.timer('prewarm'):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(warm, urls))
+
+    results['latency'] = latencies.summary('prewarm_seconds')
+    return results
+
+
+class _RateLimiter:
+    """
+    Space out request starts to a maximum rate
+    """
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self.next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
@@ -0,0 +1,266 @@
+"""
+Long-running manifester service
+
+Accepts jobs over a local HTTP or Unix-socket API and runs them from a bounded queue, so
+the SSH connection, file index, HTTP pools and caches stay warm between jobs.
+
+    POST   /jobs        submit a job ({"source_record": ..., "image_base": ...})
+    GET    /jobs        list jobs
+    GET    /jobs/<id>   job status
+    GET    /metrics     run metrics in Prometheus text format
+    GET    /status      queue depth, job counts and run report as JSON
+    DELETE /cache       forget cached dimensions and ASpace records
+"""
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from manifester.metrics import metrics
+
+# Number of finished jobs to remember for status requests.
+job_history = 1000
+
+
+class ManifestService:
+    """
+    Bounded job queue with a pool of worker threads
+
+    Attributes:
+        jobs (dict): every remembered job, by id
+    """
+    jobs: dict
+
+    def __init__(self, handler: Callable[[dict], None], workers: int = 2, queue_size: int = 100,
+                 clear_caches: Optional[Callable[[], None]] = None):
+        """
+        Constructor
+
+        :param handler: Callable[[dict], None] runs a single job's request
+        :param workers: int number of jobs to run at once
+        :param queue_size: int maximum number of waiting jobs
+        :param clear_caches: Optional[Callable[[], None]] called on DELETE /cache
+        """
+        self.handler = handler
+        self.clear_caches = clear_caches
+        self.jobs = {}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f'manifester-worker-{i}', daemon=True).start()
+
+    def submit(self, request: dict) -> dict:
+        """
+        Queue a job
+
+        :param request: dict the job request
+        :return: dict the new job
+        :raises queue.Full: if the queue is at capacity
+        """
+        if not request.get('source_record'):
+            raise ValueError('Job requires a source_record')
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'request': request,
+            'submitted': datetime.now().isoformat(),
+            'started': None,
+            'finished': None,
+            'error': None
+        }
+        self._queue.put_nowait(job)
+        with self._lock:
+            self.jobs[job['id']] = job
+        metrics.increment('jobs_submitted')
+        return job
+
+    def status(self) -> dict:
+        """
+        Queue and job counts plus the run report
+
+        :return: dict
+        """
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {
+            'queued': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'jobs': counts,
+            'metrics': metrics.report()
+        }
+
+    def serve(self, address: str) -> None:
+        """
+        Serve the API until interrupted
+
+        :param address: str 'host:port' or 'unix:/path/to/socket'
+        """
+        server = make_server(address, self)
+        logging.info(f'Listening on {address}')
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            job['status'] = 'running'
+            job['started'] = datetime.now().isoformat()
+            logging.info(f'Starting job {job["id"]}: {job["request"]["source_record"]}')
+            try:
+                with metrics.timer('job', histogram='job_seconds'):
+                    self.handler(job['request'])
+                job['status'] = 'done'
+                metrics.increment('jobs_done')
+            except Exception as e:
+                logging.exception(f'Job {job["id"]} failed')
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                metrics.increment('jobs_failed')
+            job['finished'] = datetime.now().isoformat()
+            self._forget_old_jobs()
+            self._queue.task_done()
+
+    def _forget_old_jobs(self) -> None:
+        with self._lock:
+            finished = [job for job in self.jobs.values() if job['finished']]
+            for job in finished[:max(0, len(finished) - job_history)]:
+                del self.jobs[job['id']]
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'manifester'
+
+    @property
+    def service(self) -> ManifestService:
+        return self.server.service
+
+    def do_GET(self):
+        if self.path == '/jobs':
+            with self.service._lock:
+                self._send_json(200, list(self.service.jobs.values()))
+        elif self.path.startswith('/jobs/'):
+            job = self.service.jobs.get(self.path[len('/jobs/'):])
+            if job:
+                self._send_json(200, job)
+            else:
+                self._send_json(404, {'error': 'No such job'})
+        elif self.path == '/metrics':
+            self._send(200, metrics.prometheus().encode('utf-8'), 'text/plain; version=0.0.4')
+        elif self.path == '/status':
+            self._send_json(200, self.service.status())
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = self.service.submit(json.loads(self.rfile.read(length)))
+        except queue.Full:
+            self._send_json(503, {'error': 'Job queue is full'})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        else:
+            self._send_json(202, job)
+
+    def do_DELETE(self):
+        if self.path != '/cache':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        if self.service.clear_caches:
+            self.service.clear_caches()
+        self._send_json(200, {'cleared': True})
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address.
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logging.info(f'{self.address_string()} {format % args}')
+
+    def _send_json(self, status: int, body) -> None:
+        self._send(status, json.dumps(body).encode('utf-8'), 'application/json')
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def make_server(address: str, service: ManifestService) -> socketserver.BaseServer:
+    """
+    Build the HTTP server for an address
+
+    :param address: str 'host:port' or 'unix:/path/to/socket'
+    :param service: ManifestService the service to expose
+    :return: socketserver.BaseServer
+    """
+    if address.startswith('unix:'):
+        server = UnixHTTPServer(address[len('unix:'):], ServiceRequestHandler)
+    else:
+        host, port = address.rsplit(':', 1)
+        server = ThreadingHTTPServer((host, int(port)), ServiceRequestHandler)
+    server.service = service
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__('localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def request(address: str, method: str, path: str, body: Optional[dict] = None) -> dict:
+    """
+    Call a running service
+
+    :param address: str 'host:port' or 'unix:/path/to/socket'
+    :param method: str HTTP method
+    :param path: str request path (e.g. '/jobs')
+    :param body: Optional[dict] JSON request body
+    :return: dict the JSON response
+    """
+    if address.startswith('unix:'):
+        connection = UnixHTTPConnection(address[len('unix:'):])
+    else:
+        host, port = address.rsplit(':', 1)
+        connection = http.client.HTTPConnection(host, int(port))
+    try:
+        payload = json.dumps(body) if body is not None else None
+        connection.request(method, path, body=payload, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        data = json.loads(response.read())
+    finally:
+        connection.close()
+    if response.status >= 400:
+        raise RuntimeError(f'{method} {path} failed ({response.status}): {data.get("error")}')
+    return data
@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+from manifester.metrics import metrics
+
+
+class SingleFlight:
+    """
+    Coalesce calls with the same key
+
+    The first caller for a key runs the call; callers that arrive while it is in flight,
+    or afterwards, share its result. Failed calls are not remembered, so they can be
+    retried.
+    """
+    name: str
+
+    def __init__(self, name: str):
+        """
+        Constructor
+
+        :param name: str used to name the metrics counters (e.g. 'dimensions')
+        """
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """
+        Run a call, or share the result of one already made for the key
+
+        :param key: Hashable identifies the call (e.g. an image filename)
+        :param function: Callable[[], Any] makes the call
+        :return: Any the call's result
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._calls[key] = future
+
+        if not owner:
+            metrics.increment(f'{self.name}_coalesced')
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as e:
+            # Wake the waiters first. The key may already have been forgotten or cleared
+            # (or taken by a newer call) while this one was in flight.
+            future.set_exception(e)
+            with self._lock:
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+            raise
+        future.set_result(result)
+        return result
+
+    def set(self, key: Hashable, result: Any) -> None:
+        """
+        Remember a result without making the call
+
+        :param key: Hashable identifies the call
+        :param result: Any the result
+        """
+        future = Future()
+        future.set_result(result)
+        with self._lock:
+            self._calls[key] = future
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Forget the remembered result for a key, so the next call is made again
+
+        :param key: Hashable identifies the call
+        """
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Forget every remembered result
+        """
+        with self._lock:
+            self._calls = {}
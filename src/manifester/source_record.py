@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 from typing import Optional
 
+from manifester.layout import manifest_base_url
+
 
 class SourceRecord(ABC):
     """
@@ -31,7 +33,7 @@ class SourceRecord(ABC):
 
     @property
     def manifest_url(self) -> str:
-        return f'https://library.bc.edu/iiif/manifests/{self.identifier}.json'
+        return f'{manifest_base_url}/{self.identifier}.json'
 
     @property
     def handle_url(self) -> str:
@@ -1,46 +1,195 @@
+import io
 import logging
-import re
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
 
 import paramiko
 import os
-import fnmatch
 import stat
 
 from paramiko import SFTPClient
 
-# Default image file permissions (0664). Must be world-readable for the IIIF server.
-permissions = (stat.S_IRUSR |  # readable by owner
-               stat.S_IWUSR |  # writeable by owner
-               stat.S_IRUSR |  # readable by group
-               stat.S_IRGRP |  # writeable by group
-               stat.S_IROTH  # readable by others
-               )
+from manifester.image_source import ImageSource, permissions
+from manifester.layout import Layout
+from manifester.local_directory import jp2_dimensions
+from manifester.metrics import metrics
 
+# Bytes read from the start of a JP2 file to find its image header in a single request.
+header_bytes = 4096
 
-class SSHConnection:
+
+class TransportProfile:
+    """
+    SSH and SFTP tuning for a network link
+    """
+    window_size: int
+    max_packet_size: int
+    compress: bool
+    keepalive: int
+    read_aheads: int
+    channels: int
+    retries: int
+    retry_delay: float
+
+    def __init__(self, window_size: int = paramiko.common.DEFAULT_WINDOW_SIZE,
+                 max_packet_size: int = paramiko.common.DEFAULT_MAX_PACKET_SIZE, compress: bool = False,
+                 keepalive: int = 60, read_aheads: int = 50, channels: int = 4, retries: int = 3,
+                 retry_delay: float = 1):
+        """
+        Constructor
+
+        :param window_size: int bytes the server may send before waiting for us to catch up
+        :param max_packet_size: int largest channel data packet
+        :param compress: bool compress the SSH stream
+        :param keepalive: int seconds between keepalive packets; 0 for none
+        :param read_aheads: int directory read requests kept in flight while listing
+        :param channels: int SFTP channels opened on the connection, for requests in parallel
+        :param retries: int times to reconnect and retry an idempotent operation
+        :param retry_delay: float seconds before the first retry, doubling after each
+        """
+        self.window_size = window_size
+        self.max_packet_size = max_packet_size
+        self.compress = compress
+        self.keepalive = keepalive
+        self.read_aheads = read_aheads
+        self.channels = channels
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+
+# Named transport profiles. 'default' keeps paramiko's window sizes; 'wan' is for
+# high-latency links, where the default window stalls large transfers.
+transport_profiles = {
+    'default': TransportProfile(),
+    'wan': TransportProfile(window_size=16 * 1024 * 1024, max_packet_size=64 * 1024, compress=True, keepalive=30,
+                            read_aheads=100, retries=5)
+}
+
+
+class SSHConnection(ImageSource):
     """
     SSH connection to the IIIF server
+
+    Requests go over a pool of SFTP channels on the one connection, so shards can be listed
+    and headers read in parallel. Listings, stats, reads and permission changes are retried
+    on a fresh connection if the session drops.
     """
+    connection_string: str
     image_dir: str
-    sftp: SFTPClient
+    profile: TransportProfile
     files: list
 
-    def __init__(self, connection_string: str, image_dir: str):
+    def __init__(self, connection_string: str, image_dir: str, profile: Optional[TransportProfile] = None,
+                 read_headers: bool = False, connect_options: Optional[dict] = None,
+                 layout: Optional[Layout] = None):
         """
         Constructor
 
         :type connection_string : object
         :type image_dir : str
+        :param profile: Optional[TransportProfile] transport tuning; defaults to the 'default' profile
+        :param read_headers: bool read image dimensions from the JP2 headers instead of asking the IIIF server
+        :param connect_options: Optional[dict] extra arguments for paramiko's SSHClient.connect (e.g. port)
+        :param layout: Optional[Layout] how the image directory is sharded; flat by default
         """
         connection_string_parts = connection_string.split('@')
-        username = connection_string_parts[0]
-        host = connection_string_parts[1]
-        ssh = paramiko.client.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(host, username=username)
-        self.sftp = ssh.open_sftp()
+        self._username = connection_string_parts[0]
+        self._host = connection_string_parts[1]
+        self._connect_options = connect_options if connect_options else {}
+        # Held while reconnecting.
+        self._lock = threading.Lock()
+        self._ssh = None
+        self._modes = {}
+        self._stamps = {}
+        # Each SFTP channel can't match responses to concurrent requests, so each is lent to
+        # one thread at a time. A new pool is made on every reconnect.
+        self._channels = queue.Queue()
+        self._generation = 0
+        self.profile = profile if profile else transport_profiles['default']
+        self.listing_workers = self.profile.channels
+        if layout:
+            self.layout = layout
+        self.knows_dimensions = read_headers
+        self.connection_string = connection_string
         self.image_dir = image_dir
-        self.files = self.sftp.listdir(self.image_dir)
+        self._connect()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        List the remote image directory, or forget the listed shards of a sharded one
+
+        The directory reads are pipelined, and the file modes and modification times that
+        come back with the listing are kept, so permissions can be checked and replaced
+        images found without a stat per file. The old listing is used until the new one is
+        complete.
+        """
+        files, modes = [], {}
+        if not self.layout.sharded:
+            files, modes = self._listdir('')
+        self.files = files
+        self._modes = modes
+        self._mark_refreshed()
+
+    def list_shard(self, shard: str) -> list[str]:
+        """
+        List one subdirectory of a sharded image directory
+
+        :param shard: str the subdirectory (e.g. 'bc-2022')
+        :return: list[str] the file names in it, or an empty list if it doesn't exist
+        """
+        try:
+            files, modes = self._listdir(shard)
+        except FileNotFoundError:
+            return []
+        self._modes.update(modes)
+        return files
+
+    def _listdir(self, shard: str) -> tuple[list[str], dict[str, int]]:
+        path = f'{self.image_dir}/{shard}' if shard else self.image_dir
+        prefix = f'{shard}/' if shard else ''
+
+        def listdir(sftp: SFTPClient) -> list:
+            return list(sftp.listdir_iter(path, read_aheads=self.profile.read_aheads))
+
+        with metrics.timer('sftp_listdir'):
+            attributes = self._retry('listdir', listdir)
+        metrics.increment('sftp_operations')
+        self._record_stamps({f'{prefix}{attribute.filename}': (attribute.st_mtime, attribute.st_size)
+                             for attribute in attributes})
+        modes = {f'{prefix}{attribute.filename}': attribute.st_mode for attribute in attributes}
+        return [attribute.filename for attribute in attributes], modes
+
+    def __str__(self) -> str:
+        return f'{self.connection_string}:{self.image_dir}'
+
+    def dimensions(self, filename: str) -> Optional[tuple[int, int]]:
+        """
+        Read the width and height from the JP2 image header box, if reading headers is enabled
+
+        :param filename: str the image filename
+        :return: Optional[tuple[int, int]] (width, height), or None if unknown
+        """
+        if not self.knows_dimensions:
+            return None
+        full_path = f'{self.image_dir}/{filename}'
+        try:
+            with metrics.timer('read_jp2_header', histogram='sftp_read_seconds'):
+                header = self._retry('read', lambda sftp: _read_start(sftp, full_path))
+            metrics.increment('sftp_operations')
+            metrics.increment('sftp_bytes_received', len(header))
+            found = jp2_dimensions(io.BytesIO(header))
+            if found is None:
+                # The header box is further in than usual.
+                with metrics.timer('read_jp2_header', histogram='sftp_read_seconds'):
+                    found = self._retry('read', lambda sftp: _read_dimensions(sftp, full_path))
+            return found
+        except OSError as e:
+            logging.warning(f'Could not read header of {filename}: {e}')
+            return None
 
     def upload_images(self, local_filepaths: list[str]) -> None:
         """
@@ -50,70 +199,12 @@ class SSHConnection:
         """
         for local_filepath in local_filepaths:
             file_name = os.path.split(local_filepath)
-            self.sftp.put(local_filepath, f'{self.image_dir}/{file_name}')
-
-    def list_images(self, image_base: str) -> list[str]:
-        """
-        List image files in remote directory
-
-        Iterate through several variations on possible image file name bases if necessary.
-
-        :type image_base: str the base of the filename to look for (e.g. ms-2020-020-142452)
-        :rtype: list[str] a list of jp2 files in the image directory that match our image base
-        """
-        image_files = []
-
-        # First try the bare image base.
-        logging.info(f'Looking for {image_base}')
-        image_files = self._list_files(image_base)
-        if len(image_files) > 0:
-            self._fix_permissions(image_files)
-            return image_files
-
-        # No results? Try everything lowercased.
-        image_base = image_base.lower()
-        logging.info(f'Looking for {image_base}')
-        image_files = self._list_files(image_base)
-        if len(image_files) > 0:
-            self._fix_permissions(image_files)
-            return image_files
-
-        # Still no results? Add strategic dashes.
-        image_base = re.sub(r'^([a-z]+)(\d+)', r'\1-\2', image_base)
-        logging.info(f'Looking for {image_base}')
-        image_files = self._list_files(image_base)
-        if len(image_files) > 0:
-            self._fix_permissions(image_files)
-            return image_files
-
-        # Still no results? Convert underscores to dashes.
-        image_base = image_base.replace('_', '-')
-        logging.info(f'Looking for {image_base}')
-        image_files = self._list_files(image_base)
-        if len(image_files) > 0:
-            self._fix_permissions(image_files)
-            return image_files
-
-        # Still nothing? Convert dashes to underscores.
-        image_base = image_base.replace('-', '_')
-        logging.info(f'Looking for {image_base}')
-        image_files = self._list_files(image_base)
-        if len(image_files) > 0:
-            self._fix_permissions(image_files)
-            return image_files
-
-        # Still nada? Give up.
-        return []
-
-    def _list_files(self, image_base) -> list[str]:
-        image_files = []
-        for file in self.files:
-            if fnmatch.fnmatch(file, f'{image_base}*'):
-                image_files.append(file)
-        image_files.sort()
-        return image_files
-
-    def _fix_permissions(self, image_files: list[str]):
+            with metrics.timer('sftp_upload'), self._channel() as sftp:
+                sftp.put(local_filepath, f'{self.image_dir}/{file_name}')
+            metrics.increment('sftp_operations')
+            metrics.increment('sftp_bytes_sent', os.path.getsize(local_filepath))
+
+    def fix_permissions(self, image_files: list[str]):
         """
         Set image file permissions to be readable by IIIF server
 
@@ -124,11 +215,102 @@ class SSHConnection:
 
             # Examine each file. If the file is not readable by all, change the permissions.
             full_path = os.path.join(self.image_dir, image_file)
-            info = self.sftp.stat(full_path)
+            mode = self._modes.get(image_file)
+            if mode is None:
+                with metrics.timer('fix_permissions', histogram='sftp_stat_seconds'):
+                    mode = self._retry('stat', lambda sftp: sftp.stat(full_path)).st_mode
+                metrics.increment('sftp_operations')
 
-            octal_mode = oct(stat.S_IMODE(info.st_mode))
+            octal_mode = oct(stat.S_IMODE(mode))
             logging.info(f'{full_path} has permissions {octal_mode}')
 
-            if not bool(info.st_mode & stat.S_IROTH):
+            if not bool(mode & stat.S_IROTH):
                 logging.info(f'Setting permissions for {full_path}')
-                self.sftp.chmod(full_path, permissions)
+                with metrics.timer('fix_permissions'):
+                    self._retry('chmod', lambda sftp: sftp.chmod(full_path, permissions))
+                metrics.increment('sftp_operations')
+                self._modes[image_file] = permissions
+
+    def close(self) -> None:
+        with self._lock:
+            if self._ssh:
+                self._ssh.close()
+
+    def _connect(self) -> None:
+        profile = self.profile
+
+        def transport_factory(sock, **kwargs) -> paramiko.Transport:
+            return paramiko.Transport(sock, default_window_size=profile.window_size,
+                                      default_max_packet_size=profile.max_packet_size, **kwargs)
+
+        ssh = paramiko.client.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        with metrics.timer('ssh_connect'):
+            ssh.connect(self._host, username=self._username, compress=profile.compress,
+                        transport_factory=transport_factory, **self._connect_options)
+            transport = ssh.get_transport()
+            if profile.keepalive:
+                transport.set_keepalive(profile.keepalive)
+            channels = [SFTPClient.from_transport(transport, window_size=profile.window_size,
+                                                  max_packet_size=profile.max_packet_size)
+                        for _ in range(max(profile.channels, 1))]
+        self._ssh = ssh
+        self._set_channels(channels)
+
+    def _set_channels(self, channels: list[SFTPClient]) -> None:
+        pool = queue.Queue()
+        for sftp in channels:
+            pool.put(sftp)
+        self._channels = pool
+        self._generation += 1
+
+    @contextmanager
+    def _channel(self) -> Iterator[SFTPClient]:
+        # Channels go back to the pool they came from, which is dropped after a reconnect.
+        pool = self._channels
+        sftp = pool.get()
+        try:
+            yield sftp
+        finally:
+            pool.put(sftp)
+
+    def _connected(self, sftp: SFTPClient) -> bool:
+        transport = self._ssh.get_transport() if self._ssh else None
+        return transport is not None and transport.is_active() and not sftp.sock.closed
+
+    def _retry(self, name: str, operation: Callable[[SFTPClient], Any]) -> Any:
+        """
+        Run an idempotent SFTP operation, reconnecting and retrying if the session drops
+
+        Errors from a live session (e.g. a missing file) are raised straight away.
+        """
+        for attempt in range(self.profile.retries + 1):
+            generation = self._generation
+            with self._channel() as sftp:
+                try:
+                    return operation(sftp)
+                except (EOFError, OSError, paramiko.SSHException) as e:
+                    if attempt == self.profile.retries or self._connected(sftp):
+                        raise
+                    logging.warning(f'SFTP {name} failed ({e or type(e).__name__}); reconnecting')
+            with self._lock:
+                if generation != self._generation:
+                    # Another thread has already reconnected.
+                    continue
+                time.sleep(self.profile.retry_delay * 2 ** attempt)
+                metrics.increment('ssh_reconnects')
+                try:
+                    self._ssh.close()
+                    self._connect()
+                except (OSError, paramiko.SSHException) as e:
+                    logging.warning(f'Could not reconnect to {self._host}: {e}')
+
+
+def _read_start(sftp: SFTPClient, path: str) -> bytes:
+    with sftp.open(path, 'rb', bufsize=header_bytes) as fh:
+        return fh.read(header_bytes)
+
+
+def _read_dimensions(sftp: SFTPClient, path: str) -> Optional[tuple[int, int]]:
+    with sftp.open(path, 'rb') as fh:
+        return jp2_dimensions(fh)
@@ -0,0 +1,102 @@
+import logging
+import time
+from typing import Callable
+
+from manifester.image_source import ImageSource, sequence_gaps
+
+
+class SequenceWatcher:
+    """
+    Watch an image source for image sequences that have finished uploading
+
+    A sequence is ready once it has been quiet (no new files, and no file's modification
+    time or size changing) for the quiet period and its counters run from 0001 with no gaps.
+    Each file is handed to `on_image` once it has been seen unchanged on two polls in a row,
+    so dimensions can be collected while the rest of the batch is still landing. If
+    `on_ready` raises, the sequence stays pending and is tried again after another quiet
+    period.
+    """
+    image_source: ImageSource
+    quiet_period: float
+    pending: dict
+
+    def __init__(self, image_source: ImageSource, image_bases: list[str], quiet_period: float,
+                 on_image: Callable[[str], None], on_ready: Callable[[str, list[str]], None]):
+        """
+        Constructor
+
+        :param image_source: ImageSource where the images are uploaded
+        :param image_bases: list[str] the image bases to wait for
+        :param quiet_period: float seconds a sequence must stop growing before it is ready
+        :param on_image: Callable[[str], None] called with each newly landed image filename
+        :param on_ready: Callable[[str, list[str]], None] called with a ready image base and its files
+        """
+        self.image_source = image_source
+        self.quiet_period = quiet_period
+        self.on_image = on_image
+        self.on_ready = on_ready
+        self.pending = {image_base: _Sequence() for image_base in image_bases}
+
+    def watch(self, interval: float) -> None:
+        """
+        Poll until every sequence has been handed off
+
+        :param interval: float seconds between polls
+        """
+        while self.pending:
+            self.poll()
+            if self.pending:
+                time.sleep(interval)
+
+    def poll(self) -> list[str]:
+        """
+        Check every pending sequence once
+
+        :return: list[str] the image bases that became ready
+        """
+        self.image_source.refresh()
+        now = time.monotonic()
+        ready = []
+        for image_base, sequence in list(self.pending.items()):
+            filenames = self.image_source.find_images(image_base)
+            # A file still being uploaded is already listed, but keeps growing.
+            stamps = {filename: self.image_source.stamp(filename) for filename in filenames}
+            if stamps != sequence.stamps:
+                sequence.changed = now
+            unchanged = {filename for filename, stamp in stamps.items()
+                         if filename in sequence.stamps and sequence.stamps[filename] == stamp}
+            sequence.collected &= unchanged
+
+            # Files that are the same as last time are probably complete.
+            for filename in sorted(unchanged - sequence.collected):
+                try:
+                    self.on_image(filename)
+                    sequence.collected.add(filename)
+                except Exception as e:
+                    logging.info(f'Will retry {filename}: {e}')
+            sequence.stamps = stamps
+
+            if not filenames or now - sequence.changed < self.quiet_period:
+                continue
+            gaps = sequence_gaps(filenames)
+            if gaps:
+                logging.info(f'{image_base} is missing counters {gaps}; waiting')
+                continue
+
+            logging.info(f'{image_base} has stopped growing at {len(filenames)} images')
+            try:
+                self.on_ready(image_base, filenames)
+            except Exception:
+                logging.exception(f'Could not build {image_base}; will retry')
+                sequence.changed = now
+                continue
+            del self.pending[image_base]
+            ready.append(image_base)
+        return ready
+
+
+class _Sequence:
+    def __init__(self):
+        self.stamps = {}
+        self.collected = set()
+        self.changed = time.monotonic()
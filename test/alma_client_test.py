@@ -0,0 +1,72 @@
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from manifester.alma_client import fetch_bibs, read_mms_ids
+from manifester.errors import AlmaAPIError
+
+requests_seen = []
+
+
+class StandInAlma(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if self.headers.get('Authorization') != 'apikey test-key' or 'apikey' in query:
+            self._send(400, b'<web_service_result><errorsExist>true</errorsExist></web_service_result>')
+            return
+        mms_ids = query['mms_id'][0].split(',')
+        requests_seen.append(mms_ids)
+        bibs = ''.join(
+            f'<bib><mms_id>{mms_id}</mms_id><record><leader>00000nam a2200000 a 4500</leader>'
+            f'<controlfield tag="001">{mms_id}</controlfield>'
+            f'<datafield tag="245" ind1="1" ind2="0"><subfield code="a">Title {mms_id}</subfield></datafield>'
+            f'</record></bib>'
+            for mms_id in mms_ids
+        )
+        self._send(200, f'<?xml version="1.0"?><bibs total_record_count="{len(mms_ids)}">{bibs}</bibs>'.encode())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def alma():
+    requests_seen.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInAlma)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/almaws/v1'
+    server.shutdown()
+
+
+def test_fetch_bibs_in_batches(alma):
+    mms_ids = [f'99{i:014d}' for i in range(250)]
+    records = list(fetch_bibs(mms_ids, 'test-key', alma, concurrency=3))
+    assert sorted(len(batch) for batch in requests_seen) == [50, 100, 100]
+    assert [record.identifier for record in records] == mms_ids
+    assert records[0].title == 'Title 9900000000000000'
+
+
+def test_fetch_bibs_with_identifier(alma):
+    records = list(fetch_bibs(['991234'], 'test-key', alma, identifier='im-m057-2000'))
+    assert records[0].identifier == 'im-m057-2000'
+
+
+def test_fetch_bibs_error(alma):
+    with pytest.raises(AlmaAPIError):
+        list(fetch_bibs(['991234'], 'wrong-key', alma))
+
+
+def test_read_mms_ids(tmp_path):
+    mms_file = tmp_path / 'mms.txt'
+    mms_file.write_text('991234\n995678, 999012\n\n')
+    assert list(read_mms_ids(str(mms_file))) == ['991234', '995678', '999012']
@@ -0,0 +1,77 @@
+import pytest
+
+from manifester.catalog import Catalog, parse_selection
+
+
+def _entry(identifier: str, image_base: str) -> dict:
+    return {
+        'identifier': identifier,
+        'title': f'Title of {identifier}',
+        'handle_url': f'http://hdl.handle.net/2345.2/{identifier}',
+        'first_canvas': f'https://iiif.bc.edu/iiif/2/{image_base}/canvas/0001',
+        'manifest_path': f'/manifests/{identifier}.json',
+        'view_path': f'/views/{identifier}.html',
+        'manifest_url': f'https://library.bc.edu/iiif/manifests/{identifier}.json',
+        'view_url': f'https://library.bc.edu/iiif/view/{identifier}',
+        'source_type': 'AlmaRecord',
+        'canvas_count': 12,
+        'image_base': image_base,
+        'content_hash': 'abc123',
+        'built_at': '2024-01-01T00:00:00'
+    }
+
+
+def test_record_and_query(tmp_path):
+    catalog = Catalog(str(tmp_path / 'manifests.db'))
+    catalog.record(_entry('ms-2020-020-1', 'ms-2020-020-1'))
+    catalog.record(_entry('bc-2022-172', 'bc-2022-172'))
+    catalog.record(_entry('ms-2020-020-2', 'ms-2020-020-2'))
+
+    assert [entry.identifier for entry in catalog.query()] == ['bc-2022-172', 'ms-2020-020-1', 'ms-2020-020-2']
+    entries = catalog.query({'image_base': 'ms-2020-*'})
+    assert [entry.identifier for entry in entries] == ['ms-2020-020-1', 'ms-2020-020-2']
+    assert entries[0].title == 'Title of ms-2020-020-1'
+    assert entries[0].handle_url == 'http://hdl.handle.net/2345.2/ms-2020-020-1'
+    assert entries[0].canvas_count == 12
+
+
+def test_rebuilding_replaces_row(tmp_path):
+    catalog = Catalog(str(tmp_path / 'manifests.db'))
+    catalog.record(_entry('bc-2022-172', 'bc-2022-172'))
+    rebuilt = _entry('bc-2022-172', 'bc-2022-172')
+    rebuilt['canvas_count'] = 14
+    catalog.record(rebuilt)
+    assert [entry.canvas_count for entry in catalog.query()] == [14]
+
+
+def test_get_with_image_stamps(tmp_path):
+    catalog = Catalog(str(tmp_path / 'manifests.db'))
+    entry = _entry('bc-2022-172', 'bc-2022-172')
+    entry['image_stamps'] = '{"bc-2022/bc-2022-172_0001.jp2": [1700000000.5, 4096]}'
+    catalog.record(entry)
+    assert catalog.get('bc-2022-172').image_stamps == {'bc-2022/bc-2022-172_0001.jp2': (1700000000.5, 4096)}
+    assert catalog.get('bc-2022-173') is None
+
+
+def test_unknown_column(tmp_path):
+    catalog = Catalog(str(tmp_path / 'manifests.db'))
+    with pytest.raises(ValueError):
+        catalog.query({'nope': '*'})
+
+
+def test_parse_selection():
+    assert parse_selection(['image_base=ms-2020-*', 'source_type=XLSXRow']) == {
+        'image_base': 'ms-2020-*',
+        'source_type': 'XLSXRow'
+    }
+    assert parse_selection(None) == {}
+
+
+def test_update(tmp_path):
+    catalog = Catalog(str(tmp_path / 'manifests.db'))
+    catalog.record(_entry('bc-2022-172', 'bc-2022-172'))
+    assert catalog.query()[0].manifest_url == 'https://library.bc.edu/iiif/manifests/bc-2022-172.json'
+    catalog.update('bc-2022-172', {'manifest_url': 'https://library.bc.edu/iiif/manifests/bc-2022/bc-2022-172.json'})
+    assert catalog.query()[0].manifest_url == 'https://library.bc.edu/iiif/manifests/bc-2022/bc-2022-172.json'
+    with pytest.raises(ValueError):
+        catalog.update('bc-2022-172', {'nope': ''})
@@ -0,0 +1,27 @@
+import pytest
+
+from manifester.image_source import ImageSource
+
+
+class FakeSource(ImageSource):
+    """
+    In-memory image source; tests set `files` directly
+    """
+    def __init__(self):
+        self.files = []
+        self.fixed = []
+        self.refresh()
+
+    def refresh(self) -> None:
+        self._mark_refreshed()
+
+    def fix_permissions(self, image_files: list[str]) -> None:
+        self.fixed.append(list(image_files))
+
+    def __str__(self) -> str:
+        return 'fake'
+
+
+@pytest.fixture
+def image_source() -> FakeSource:
+    return FakeSource()
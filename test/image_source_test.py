@@ -0,0 +1,120 @@
+import os
+import struct
+
+from manifester.image_source import name_variants, sequence_gaps
+from manifester.inventory_file import InventoryFile
+from manifester.layout import Layout
+from manifester.local_directory import LocalDirectory
+
+
+def _jp2(width: int, height: int) -> bytes:
+    signature = struct.pack('>I4s4s', 12, b'jP  ', b'\r\n\x87\n')
+    ftyp = struct.pack('>I4s4sI4s', 20, b'ftyp', b'jp2 ', 0, b'jp2 ')
+    ihdr = struct.pack('>I4sIIHBBBB', 22, b'ihdr', height, width, 3, 7, 7, 0, 0)
+    jp2h = struct.pack('>I4s', 8 + len(ihdr), b'jp2h') + ihdr
+    return signature + ftyp + jp2h
+
+
+def test_name_variants():
+    assert name_variants('MS2020_020') == ['MS2020_020', 'ms2020_020', 'ms-2020_020', 'ms-2020-020', 'ms_2020_020']
+
+
+def test_inventory_csv(tmp_path):
+    inventory = tmp_path / 'inventory.csv'
+    inventory.write_text('filename,width,height\nbc-2022-172_0002.jp2,600,800\nbc-2022-172_0001.jp2,601,801\n')
+    source = InventoryFile(str(inventory))
+    assert source.list_images('BC-2022-172') == ['bc-2022-172_0001.jp2', 'bc-2022-172_0002.jp2']
+    assert source.dimensions('bc-2022-172_0001.jp2') == (601, 801)
+    assert source.dimensions('missing.jp2') is None
+
+
+def test_inventory_jsonl(tmp_path):
+    inventory = tmp_path / 'inventory.jsonl'
+    inventory.write_text('{"filename": "bc2023-159_0019.jp2", "width": 10, "height": 20}\n')
+    source = InventoryFile(str(inventory))
+    assert source.list_images('bc2023-159') == ['bc2023-159_0019.jp2']
+    assert source.dimensions('bc2023-159_0019.jp2') == (10, 20)
+
+
+def test_local_directory(tmp_path):
+    (tmp_path / 'bc-2022-172_0001.jp2').write_bytes(_jp2(1200, 1600))
+    (tmp_path / 'other_0001.jp2').write_bytes(_jp2(1, 1))
+    source = LocalDirectory(str(tmp_path))
+    assert source.list_images('bc2022_172') == ['bc-2022-172_0001.jp2']
+    assert source.dimensions('bc-2022-172_0001.jp2') == (1200, 1600)
+
+
+def test_local_directory_sharded(tmp_path):
+    (tmp_path / 'bc-2022').mkdir()
+    (tmp_path / 'bc-2022' / 'bc-2022-172_0002.jp2').write_bytes(_jp2(600, 800))
+    (tmp_path / 'bc-2022' / 'bc-2022-172_0001.jp2').write_bytes(_jp2(1200, 1600))
+    (tmp_path / 'bc-2021').mkdir()
+    (tmp_path / 'bc-2021' / 'bc-2021-001_0001.jp2').write_bytes(_jp2(1, 1))
+    source = LocalDirectory(str(tmp_path), Layout('prefix'))
+    assert source.files == []
+    listed = []
+    list_shard = source.list_shard
+    source.list_shard = lambda shard: listed.append(shard) or list_shard(shard)
+    source.prepare(['BC-2022-172'])
+    assert listed == ['BC-2022']
+    assert source.find_images('BC-2022-172') == ['bc-2022/bc-2022-172_0001.jp2', 'bc-2022/bc-2022-172_0002.jp2']
+    assert listed == ['BC-2022', 'bc-2022']
+    assert source.list_images('bc2022_172') == ['bc-2022/bc-2022-172_0001.jp2', 'bc-2022/bc-2022-172_0002.jp2']
+    assert source.dimensions('bc-2022/bc-2022-172_0001.jp2') == (1200, 1600)
+    assert source.list_images('bc-2023-001') == []
+    assert sequence_gaps(source.find_images('bc-2022-172')) == []
+
+
+def test_replaced_image_has_changed(tmp_path):
+    for counter in (1, 2):
+        path = tmp_path / f'bc-2022-172_000{counter}.jp2'
+        path.write_bytes(_jp2(600, 800))
+        os.utime(path, (1000, 1000))
+    source = LocalDirectory(str(tmp_path))
+    image_files = source.list_images('bc-2022-172')
+    assert source.unchanged_since(image_files, 2000) == image_files
+
+    # Replaced after a manifest was written at 2000.
+    replaced = tmp_path / 'bc-2022-172_0002.jp2'
+    replaced.write_bytes(_jp2(1200, 1600))
+    os.utime(replaced, (3000, 3000))
+    source.refresh()
+    assert source.unchanged_since(image_files, 2000) == ['bc-2022-172_0001.jp2']
+    assert source.modified('bc-2022-172_0002.jp2') == 3000
+    assert source.modified('missing.jp2') is None
+
+
+def test_unchanged_compares_size(tmp_path):
+    image = tmp_path / 'bc-2022-172_0001.jp2'
+    image.write_bytes(_jp2(600, 800))
+    os.utime(image, (1000, 1000))
+    source = LocalDirectory(str(tmp_path))
+    recorded = {'bc-2022-172_0001.jp2': source.stamp('bc-2022-172_0001.jp2')}
+    assert source.unchanged(['bc-2022-172_0001.jp2'], recorded) == ['bc-2022-172_0001.jp2']
+
+    # Replaced with its modification time kept (e.g. cp -p).
+    image.write_bytes(_jp2(1200, 1600) + b'\0')
+    os.utime(image, (1000, 1000))
+    source.refresh()
+    assert source.unchanged(['bc-2022-172_0001.jp2'], recorded) == []
+
+
+def test_changed_listing_is_reported(tmp_path):
+    image = tmp_path / 'bc-2022-172_0001.jp2'
+    image.write_bytes(_jp2(600, 800))
+    os.utime(image, (1000, 1000))
+    source = LocalDirectory(str(tmp_path))
+    changed = []
+    source.on_change = changed.append
+    source.refresh()
+    assert changed == []
+
+    image.write_bytes(_jp2(1200, 1600))
+    source.refresh()
+    assert changed == ['bc-2022-172_0001.jp2']
+
+
+def test_sequence_gaps():
+    assert sequence_gaps(['a_0001.jp2', 'a_0002.jp2', 'a_0003.jp2']) == []
+    assert sequence_gaps(['a_0001.jp2', 'a_0004.jp2']) == [2, 3]
+    assert sequence_gaps(['a_0002.jp2']) == [1]
@@ -0,0 +1,65 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from manifester.layout import OutputLayout, migrate
+from manifester.output import HashIndex, write_json
+
+
+def test_flat():
+    layout = OutputLayout()
+    assert layout.path('bc-2022-172', '.json', 'out') == os.path.join('out', 'bc-2022-172.json')
+    assert layout.manifest_url('bc-2022-172') == 'https://library.bc.edu/iiif/manifests/bc-2022-172.json'
+    assert layout.view_url('bc-2022-172') == 'https://library.bc.edu/iiif/view/bc-2022-172'
+
+
+def test_hash():
+    layout = OutputLayout('hash', depth=2)
+    shard = layout.shard('bc-2022-172')
+    assert len(shard) == 2 and all(len(part) == 2 for part in shard)
+    assert shard == OutputLayout('hash', depth=2).shard('bc-2022-172')
+    assert layout.path('bc-2022-172', '.html') == os.path.join(*shard, 'bc-2022-172.html')
+    assert layout.manifest_url('bc-2022-172') == \
+        f'https://library.bc.edu/iiif/manifests/{shard[0]}/{shard[1]}/bc-2022-172.json'
+
+
+def test_prefix():
+    layout = OutputLayout('prefix')
+    assert layout.shard('ms-2020-020-142452') == ['ms-2020-020']
+    assert layout.shard('bc-2022-172') == ['bc-2022']
+    assert layout.shard('9900000000000001') == OutputLayout('hash').shard('9900000000000001')
+    assert layout.view_url('bc-2022-172') == 'https://library.bc.edu/iiif/view/bc-2022/bc-2022-172'
+
+
+def test_unknown_layout():
+    with pytest.raises(ValueError):
+        OutputLayout('nope')
+
+
+def test_migrate(tmp_path):
+    flat = OutputLayout()
+    manifest = {'@id': flat.manifest_url('bc-2022-172'), '@type': 'sc:Manifest'}
+    write_json(str(tmp_path / 'bc-2022-172.json'), manifest, compress=['gzip'])
+    (tmp_path / 'bc-2022-172.html').write_text(f'"manifestUri": "{flat.manifest_url("bc-2022-172")}"')
+    (tmp_path / 'changes.json').write_text('{"added": []}')
+
+    layout = OutputLayout('prefix')
+    hash_index = HashIndex()
+    redirects = migrate(str(tmp_path), layout, hash_index)
+
+    new_url = layout.manifest_url('bc-2022-172')
+    assert redirects == [
+        ('https://library.bc.edu/iiif/view/bc-2022-172', 'https://library.bc.edu/iiif/view/bc-2022/bc-2022-172'),
+        (flat.manifest_url('bc-2022-172'), new_url)
+    ]
+    assert sorted(os.listdir(tmp_path)) == ['bc-2022', 'changes.json']
+    assert json.loads((tmp_path / 'bc-2022' / 'bc-2022-172.json').read_text())['@id'] == new_url
+    with gzip.open(tmp_path / 'bc-2022' / 'bc-2022-172.json.gz') as fh:
+        assert json.load(fh)['@id'] == new_url
+    assert new_url in (tmp_path / 'bc-2022' / 'bc-2022-172.html').read_text()
+    assert hash_index.get(str(tmp_path / 'bc-2022-172.json')) is None
+
+    # Running it again moves nothing.
+    assert migrate(str(tmp_path), layout, hash_index) == []
@@ -0,0 +1,40 @@
+from manifester.image import Image
+from manifester.manifest_builder import build_manifest, read_dimensions
+from manifester.source_record import SourceRecord
+
+
+class FakeRecord(SourceRecord):
+    identifier = 'bc-2022-172'
+    title = 'A title'
+    publication_year = '2022'
+
+
+def _image(filename: str, width: int, height: int, shard: str = None) -> Image:
+    image = Image(filename, 'https://iiif.bc.edu/iiif/2/', shard)
+    image.width = width
+    image.height = height
+    return image
+
+
+def test_read_dimensions_round_trip():
+    images = [_image('bc-2022-172_0001.jp2', 600, 800), _image('bc-2022-172_0002.jp2', 601, 801)]
+    manifest = build_manifest(images, FakeRecord(), 'http://hdl.handle.net/2345.2/bc-2022-172')
+    assert read_dimensions(manifest) == {
+        'bc-2022-172_0001.jp2': (600, 800),
+        'bc-2022-172_0002.jp2': (601, 801)
+    }
+
+
+def test_sharded_image_identifiers():
+    images = [_image('bc-2022-172_0001.jp2', 600, 800, shard='bc-2022')]
+    manifest = build_manifest(images, FakeRecord(), 'http://hdl.handle.net/2345.2/bc-2022-172',
+                              'https://library.bc.edu/iiif/manifests/bc-2022/bc-2022-172.json')
+    assert manifest['@id'] == 'https://library.bc.edu/iiif/manifests/bc-2022/bc-2022-172.json'
+    resource = manifest['sequences'][0]['canvases'][0]['images'][0]['resource']
+    assert resource['service']['@id'] == 'https://iiif.bc.edu/iiif/2/bc-2022%2Fbc-2022-172_0001.jp2'
+    assert manifest['sequences'][0]['canvases'][0]['@id'] == 'https://iiif.bc.edu/iiif/2/bc-2022-172/canvas/0001'
+    assert read_dimensions(manifest) == {'bc-2022-172_0001.jp2': (600, 800)}
+
+
+def test_read_dimensions_empty_manifest():
+    assert read_dimensions({}) == {}
@@ -0,0 +1,31 @@
+import types
+
+from manifester.marcxml import iter_records
+
+collection = '''<?xml version="1.0" encoding="UTF-8"?>
+<collection xmlns="http://www.loc.gov/MARC21/slim">
+{records}
+</collection>
+'''
+
+record = '''<record>
+  <leader>00000nam a2200000 a 4500</leader>
+  <controlfield tag="001">99{n:014d}</controlfield>
+  <datafield tag="245" ind1="1" ind2="0">
+    <subfield code="a">Title {n}</subfield>
+    <subfield code="c">by someone</subfield>
+  </datafield>
+</record>'''
+
+
+def test_iter_records(tmp_path):
+    marcxml_file = tmp_path / 'records.xml'
+    marcxml_file.write_text(collection.format(records='\n'.join(record.format(n=n) for n in range(3))))
+    records = iter_records(str(marcxml_file))
+    assert isinstance(records, types.GeneratorType)
+    records = list(records)
+    assert len(records) == 3
+    assert records[1]['001'].data == '9900000000000001'
+    assert records[1]['245']['a'] == 'Title 1'
+    assert tuple(records[1]['245'].indicators) == ('1', '0')
+    assert str(records[1].leader) == '00000nam a2200000 a 4500'
@@ -0,0 +1,52 @@
+import json
+
+from manifester.metrics import Metrics
+
+
+def test_timer_accumulates_stage():
+    metrics = Metrics()
+    with metrics.timer('write_files'):
+        pass
+    with metrics.timer('write_files'):
+        pass
+    assert metrics.stages['write_files']['count'] == 2
+
+
+def test_counters():
+    metrics = Metrics()
+    metrics.increment('http_requests')
+    metrics.increment('http_bytes_received', 512)
+    metrics.increment('http_bytes_received', 512)
+    assert metrics.counters == {'http_requests': 1, 'http_bytes_received': 1024}
+
+
+def test_histogram_summary():
+    metrics = Metrics()
+    for value in range(1, 101):
+        metrics.observe('info_json_seconds', value / 100)
+    summary = metrics.summary('info_json_seconds')
+    assert summary['count'] == 100
+    assert summary['p50'] == .5
+    assert summary['p99'] == .99
+    assert summary['max'] == 1.0
+
+
+def test_write_report(tmp_path):
+    metrics = Metrics()
+    metrics.increment('records')
+    report_file = tmp_path / 'report.json'
+    metrics.write_report(str(report_file))
+    report = json.loads(report_file.read_text())
+    assert report['counters']['records'] == 1
+
+
+def test_write_prometheus(tmp_path):
+    metrics = Metrics()
+    metrics.increment('http_requests', 3)
+    metrics.observe('info_json_seconds', .02)
+    prom_file = tmp_path / 'manifester.prom'
+    metrics.write_prometheus(str(prom_file))
+    text = prom_file.read_text()
+    assert 'manifester_http_requests_total 3' in text
+    assert 'manifester_info_json_seconds_bucket{le="0.025"} 1' in text
+    assert 'manifester_info_json_seconds_count 1' in text
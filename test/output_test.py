@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from manifester import output
+from manifester.output import ADDED, CHANGED, UNCHANGED, HashIndex, file_digest, write_json, write_text
+
+manifest = {
+    '@id': 'https://library.bc.edu/iiif/manifests/bc-2022-172.json',
+    'sequences': [{'canvases': [{'label': f'bc-2022-172_{i:04d}', 'width': 600} for i in range(1, 2000)]}]
+}
+
+
+def test_default_matches_json_dumps(tmp_path):
+    filename = tmp_path / 'bc-2022-172.json'
+    write_json(str(filename), manifest)
+    assert filename.read_text() == json.dumps(manifest)
+    assert [path.name for path in tmp_path.iterdir()] == ['bc-2022-172.json']
+
+
+def test_compact(tmp_path):
+    filename = tmp_path / 'bc-2022-172.json'
+    write_json(str(filename), manifest, compact=True)
+    assert filename.read_text() == json.dumps(manifest, separators=(',', ':'))
+
+
+def test_gzip(tmp_path):
+    filename = tmp_path / 'bc-2022-172.json'
+    write_json(str(filename), manifest, compress=['gzip'])
+    compressed = (tmp_path / 'bc-2022-172.json.gz').read_bytes()
+    assert gzip.decompress(compressed) == filename.read_bytes()
+    assert len(compressed) < len(filename.read_bytes()) / 10
+
+
+def test_brotli(tmp_path):
+    brotli = pytest.importorskip('brotli')
+    filename = tmp_path / 'bc-2022-172.json'
+    write_json(str(filename), manifest, compress=['br'])
+    assert brotli.decompress((tmp_path / 'bc-2022-172.json.br').read_bytes()) == filename.read_bytes()
+
+
+def test_brotli_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(output, 'brotli', None)
+    with pytest.raises(Exception, match='requires the brotli package'):
+        write_json(str(tmp_path / 'bc-2022-172.json'), manifest, compress=['br'])
+
+
+def test_unchanged_file_is_not_rewritten(tmp_path):
+    filename = tmp_path / 'bc-2022-172.json'
+    assert write_json(str(filename), manifest) == ADDED
+    os.utime(filename, (0, 0))
+    assert write_json(str(filename), manifest) == UNCHANGED
+    assert filename.stat().st_mtime == 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['bc-2022-172.json']
+
+
+def test_changed_file_is_rewritten(tmp_path):
+    filename = tmp_path / 'bc-2022-172.html'
+    write_text(str(filename), '<html></html>')
+    assert write_text(str(filename), '<html>new</html>') == CHANGED
+    assert filename.read_text() == '<html>new</html>'
+
+
+def test_missing_compressed_copy_is_written(tmp_path):
+    filename = tmp_path / 'bc-2022-172.json'
+    write_json(str(filename), manifest)
+    assert write_json(str(filename), manifest, compress=['gzip']) == CHANGED
+    assert (tmp_path / 'bc-2022-172.json.gz').exists()
+
+
+def test_hash_index(tmp_path):
+    index_file = tmp_path / 'hashes.json'
+    filename = tmp_path / 'bc-2022-172.json'
+    hash_index = HashIndex(str(index_file))
+    write_json(str(filename), manifest, hash_index=hash_index)
+    hash_index.save()
+
+    reloaded = HashIndex(str(index_file))
+    assert reloaded.get(str(filename)) == file_digest(str(filename))
+    assert write_json(str(filename), manifest, hash_index=reloaded) == UNCHANGED
@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+
+import pytest
+
+from manifester.pipeline import Stage, run_pipeline
+
+
+def test_results_in_input_order():
+    def jitter(item):
+        time.sleep(random.random() / 100)
+        return item * 10
+
+    written = []
+    stages = [
+        Stage('lookup', jitter, concurrency=4),
+        Stage('write', lambda item: written.append(item) or item, ordered=True)
+    ]
+    assert run_pipeline(range(20), stages) == [item * 10 for item in range(20)]
+    assert written == [item * 10 for item in range(20)]
+
+
+def test_stage_concurrency_limit():
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def track(item):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(.01)
+        with lock:
+            running[0] -= 1
+        return item
+
+    run_pipeline(range(12), [Stage('lookup', track, concurrency=3)], queue_size=10)
+    assert running[1] <= 3
+
+
+def test_backpressure_limits_read_ahead():
+    consumed = []
+    release = threading.Event()
+
+    def items():
+        for item in range(50):
+            consumed.append(item)
+            yield item
+
+    def slow_write(item):
+        release.wait()
+        return item
+
+    thread = threading.Thread(target=run_pipeline, args=(items(), [Stage('write', slow_write, ordered=True)], 2))
+    thread.start()
+    time.sleep(.1)
+    assert len(consumed) < 10
+    release.set()
+    thread.join()
+    assert len(consumed) == 50
+
+
+def test_stage_error_stops_pipeline():
+    def fail(item):
+        if item == 3:
+            raise Exception('Found no images for 3')
+        return item
+
+    with pytest.raises(Exception, match='Found no images for 3'):
+        run_pipeline(range(10), [Stage('list', fail, concurrency=2), Stage('write', lambda item: item, ordered=True)])
+
+
+def test_slow_item_limits_reorder_buffer():
+    consumed = []
+    release = threading.Event()
+
+    def items():
+        for item in range(50):
+            consumed.append(item)
+            yield item
+
+    def lookup(item):
+        if item == 0:
+            release.wait()
+        return item
+
+    stages = [Stage('lookup', lookup, concurrency=4), Stage('write', lambda item: item, ordered=True)]
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(run_pipeline(items(), stages, 2)))
+    thread.start()
+    time.sleep(.1)
+    try:
+        assert len(consumed) < 10
+    finally:
+        release.set()
+        thread.join()
+    assert results == list(range(50))
@@ -0,0 +1,78 @@
+from manifester.preflight import plan
+from manifester.source_record import SourceRecord
+
+
+class FakeRecord(SourceRecord):
+    def __init__(self, identifier, title='A title', broken_citation=False, handle_url='http://hdl.handle.net/2345.2/x'):
+        self._identifier = identifier
+        self._title = title
+        self._broken_citation = broken_citation
+        self._handle_url = handle_url
+
+    @property
+    def identifier(self) -> str:
+        return self._identifier
+
+    @property
+    def title(self) -> str:
+        return self._title
+
+    @property
+    def handle_url(self) -> str:
+        return self._handle_url
+
+    @property
+    def publication_year(self) -> str:
+        raise NotImplementedError()
+
+    @property
+    def citation(self):
+        if self._broken_citation:
+            return self.publication_year
+        return None
+
+
+def test_plan_ok(image_source):
+    image_source.files = ['bc-2022-172_0001.jp2', 'bc-2022-172_0002.jp2', 'bc-2022-173_0001.jp2']
+    batch_plan = plan([FakeRecord('bc-2022-172'), FakeRecord('bc-2022-173'), FakeRecord(None)], image_source)
+    assert batch_plan.ok
+    assert batch_plan.skipped == 1
+    assert [entry.image_count for entry in batch_plan.entries] == [2, 1]
+    assert batch_plan.estimates['images'] == 3
+    assert batch_plan.estimates['info_json_requests'] == 3
+    assert batch_plan.estimates['files_written'] == 6
+
+
+def test_plan_problems(image_source):
+    image_source.files = ['bc-2022-172_0001.jp2', 'bc-2022-172_0003.jp2', 'bc-2022-173_0001.jp2']
+    records = [
+        FakeRecord('bc-2022-172'),
+        FakeRecord('bc-2022-173', title=''),
+        FakeRecord('bc-2022-173'),
+        FakeRecord('bc-2022-174', broken_citation=True)
+    ]
+    batch_plan = plan(records, image_source)
+    assert not batch_plan.ok
+    assert batch_plan.problems == [
+        'bc-2022-172: missing counters 2',
+        'bc-2022-173: missing title',
+        'bc-2022-173: duplicate of record 2',
+        'bc-2022-174: citation: NotImplementedError',
+        'bc-2022-174: found no images for bc-2022-174'
+    ]
+    assert 'bc-2022-174' in batch_plan.report()
+
+
+def test_plan_with_known_dimensions(image_source):
+    image_source.files = ['bc-2022-172_0001.jp2']
+    image_source.knows_dimensions = True
+    batch_plan = plan([FakeRecord('x')], image_source, image_base='bc-2022-172')
+    assert batch_plan.entries[0].resolved_base == 'bc-2022-172'
+    assert batch_plan.estimates['info_json_requests'] == 0
+
+
+def test_plan_missing_handle_url(image_source):
+    image_source.files = ['bc-2022-172_0001.jp2']
+    records = [FakeRecord('bc-2022-172', handle_url='')]
+    assert plan(records, image_source).problems == ['bc-2022-172: missing handle_url']
+    assert plan(records, image_source, handle_url='http://hdl.handle.net/2345.2/bc-2022-172').ok
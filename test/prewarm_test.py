@@ -0,0 +1,60 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from manifester.image import Image
+from manifester.prewarm import prewarm, tile_urls, warm_urls
+
+
+def _image(filename: str, width: int, height: int) -> Image:
+    image = Image(filename, 'https://iiif.bc.edu/iiif/2')
+    image.width = width
+    image.height = height
+    return image
+
+
+def test_tile_urls_fit_viewport():
+    image = _image('bc-2022-172_0001.jp2', 3000, 2000)
+    assert tile_urls(image) == [
+        'https://iiif.bc.edu/iiif/2/bc-2022-172_0001.jp2/0,0,2048,2000/512,/0/default.jpg',
+        'https://iiif.bc.edu/iiif/2/bc-2022-172_0001.jp2/2048,0,952,2000/238,/0/default.jpg'
+    ]
+
+
+def test_small_image_is_one_tile():
+    image = _image('bc-2022-172_0001.jp2', 400, 300)
+    assert tile_urls(image) == ['https://iiif.bc.edu/iiif/2/bc-2022-172_0001.jp2/0,0,400,300/400,/0/default.jpg']
+
+
+def test_warm_urls_thumbnails_and_opening_tiles():
+    images = [_image(f'bc-2022-172_{i:04d}.jp2', 400, 300) for i in range(1, 6)]
+    urls = warm_urls(images, 2)
+    assert len(urls) == 5 + 2
+    assert urls[0] == images[0].thumbnail_url
+
+
+def test_prewarm_requests_every_url():
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requested.append(self.path)
+            self.send_response(404 if 'missing' in self.path else 200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        results = prewarm([f'{base}/a', f'{base}/b', f'{base}/missing'], concurrency=2, rate=100)
+    finally:
+        server.shutdown()
+    assert sorted(requested) == ['/a', '/b', '/missing']
+    assert results['warmed'] == 2
+    assert results['failed'] == 1
+    assert results['failed_urls'] == [f'{base}/missing']
+    assert results['latency']['count'] == 3
@@ -0,0 +1,49 @@
+import queue
+import threading
+
+import pytest
+
+from manifester import service
+from manifester.service import ManifestService, make_server
+
+
+def _serve(job_service):
+    server = make_server('127.0.0.1:0', job_service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'127.0.0.1:{server.server_address[1]}'
+
+
+def test_jobs_run_and_report_status():
+    handled = []
+    job_service = ManifestService(handled.append, workers=1)
+    server, address = _serve(job_service)
+    try:
+        job = service.request(address, 'POST', '/jobs', {'source_record': 'rec.mrc'})
+        job_service._queue.join()
+        status = service.request(address, 'GET', f'/jobs/{job["id"]}')
+    finally:
+        server.shutdown()
+    assert handled == [{'source_record': 'rec.mrc'}]
+    assert status['status'] == 'done'
+
+
+def test_failed_job_records_error():
+    def fail(request):
+        raise Exception('Found no images for x')
+    job_service = ManifestService(fail, workers=1)
+    job = job_service.submit({'source_record': 'x.mrc'})
+    job_service._queue.join()
+    assert job['status'] == 'failed'
+    assert job['error'] == 'Found no images for x'
+
+
+def test_queue_is_bounded():
+    release = threading.Event()
+    job_service = ManifestService(lambda request: release.wait(), workers=1, queue_size=1)
+    job_service.submit({'source_record': 'a.mrc'})
+    try:
+        with pytest.raises(queue.Full):
+            for i in range(3):
+                job_service.submit({'source_record': 'b.mrc'})
+    finally:
+        release.set()
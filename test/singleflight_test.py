@@ -0,0 +1,85 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from manifester.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_call():
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        time.sleep(.05)
+        return 600, 800
+
+    dimensions = SingleFlight('dimensions')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: dimensions.do('bc-2022-172_0001.jp2', lookup), range(8)))
+    assert results == [(600, 800)] * 8
+    assert len(calls) == 1
+
+
+def test_failures_are_not_remembered():
+    dimensions = SingleFlight('dimensions')
+
+    def fail():
+        raise Exception('404')
+
+    with pytest.raises(Exception):
+        dimensions.do('bc-2022-172_0001.jp2', fail)
+    assert dimensions.do('bc-2022-172_0001.jp2', lambda: (1, 2)) == (1, 2)
+
+
+def test_clear_during_failed_call():
+    dimensions = SingleFlight('dimensions')
+    running = threading.Event()
+    release = threading.Event()
+    errors = {}
+
+    def fail():
+        running.set()
+        release.wait()
+        raise ValueError('404')
+
+    def call(name, function):
+        try:
+            dimensions.do('bc-2022-172_0001.jp2', function)
+        except BaseException as e:
+            errors[name] = e
+
+    owner = threading.Thread(target=call, args=('owner', fail), daemon=True)
+    owner.start()
+    running.wait()
+    waiter = threading.Thread(target=call, args=('waiter', lambda: (1, 2)), daemon=True)
+    waiter.start()
+    time.sleep(.05)
+    dimensions.clear()
+    release.set()
+    owner.join(1)
+    waiter.join(1)
+    assert isinstance(errors.get('owner'), ValueError)
+    assert isinstance(errors.get('waiter'), ValueError)
+
+
+def test_set_forget_and_clear():
+    dimensions = SingleFlight('dimensions')
+    dimensions.set('bc-2022-172_0001.jp2', (1, 2))
+    assert dimensions.do('bc-2022-172_0001.jp2', lambda: (3, 4)) == (1, 2)
+    dimensions.clear()
+    assert dimensions.do('bc-2022-172_0001.jp2', lambda: (3, 4)) == (3, 4)
+    dimensions.forget('bc-2022-172_0001.jp2')
+    assert dimensions.do('bc-2022-172_0001.jp2', lambda: (5, 6)) == (5, 6)
+
+
+def test_name_variants_share_one_listing(image_source):
+    image_source.files = ['bc-2022-172_0001.jp2', 'bc-2022-172_0002.jp2']
+    assert image_source.list_images('BC2022_172') == ['bc-2022-172_0001.jp2', 'bc-2022-172_0002.jp2']
+    assert image_source.list_images('bc-2022-172') == ['bc-2022-172_0001.jp2', 'bc-2022-172_0002.jp2']
+    assert len(image_source.fixed) == 1
+
+    image_source.refresh()
+    image_source.list_images('bc-2022-172')
+    assert len(image_source.fixed) == 2
@@ -0,0 +1,108 @@
+import paramiko
+import pytest
+
+from manifester.image_source import permissions
+from manifester.layout import Layout
+from manifester.ssh_connection import SSHConnection, TransportProfile
+
+
+class FakeSFTP:
+    def __init__(self, files: dict, failures: int = 0):
+        self.files = files
+        self.failures = failures
+        self.chmods = []
+        self.stats = 0
+        self.sock = self
+
+    @property
+    def closed(self) -> bool:
+        return self.failures > 0
+
+    def listdir_iter(self, path: str, read_aheads: int = 50):
+        if self.failures:
+            self.failures -= 1
+            raise EOFError()
+        directory = path[len('/images/'):] if path.startswith('/images/') else ''
+        listing = [(name.rpartition('/')[2], mode) for name, mode in self.files.items()
+                   if name.rpartition('/')[0] == directory]
+        if directory and not listing:
+            raise FileNotFoundError(path)
+        return [paramiko.SFTPAttributes.from_stat(FakeStat(mode), name) for name, mode in listing]
+
+    def stat(self, path: str):
+        self.stats += 1
+        return FakeStat(0o100664)
+
+    def chmod(self, path: str, mode: int) -> None:
+        self.chmods.append((path, mode))
+
+
+class FakeStat:
+    def __init__(self, mode: int):
+        self.st_mode = mode
+        self.st_size = 0
+        self.st_uid = 0
+        self.st_gid = 0
+        self.st_atime = 0
+        self.st_mtime = 0
+
+
+class FakeConnection(SSHConnection):
+    def __init__(self, sftp: FakeSFTP, profile: TransportProfile, layout: Layout = None):
+        self.fake = sftp
+        self.connections = 0
+        super().__init__('user@example.org', '/images', profile, layout=layout)
+
+    def _connect(self) -> None:
+        self.connections += 1
+        self._ssh = paramiko.SSHClient()
+        self._set_channels([self.fake])
+
+
+def test_listing_reconnects():
+    sftp = FakeSFTP({'bc-2022-172_0001.jp2': 0o100664}, failures=2)
+    connection = FakeConnection(sftp, TransportProfile(retries=3, retry_delay=0))
+    assert connection.files == ['bc-2022-172_0001.jp2']
+    assert connection.connections == 3
+
+
+def test_listing_gives_up():
+    sftp = FakeSFTP({}, failures=5)
+    with pytest.raises(EOFError):
+        FakeConnection(sftp, TransportProfile(retries=1, retry_delay=0))
+
+
+def test_refresh_keeps_old_listing_until_done():
+    sftp = FakeSFTP({'bc-2022-172_0001.jp2': 0o100664})
+    connection = FakeConnection(sftp, TransportProfile(retry_delay=0))
+    seen = []
+    listdir_iter = sftp.listdir_iter
+
+    def slow_listdir_iter(path: str, read_aheads: int = 50):
+        # Another job looking for images while the directory is re-listed.
+        seen.append(connection.find_images('bc-2022-172'))
+        return listdir_iter(path, read_aheads)
+
+    sftp.listdir_iter = slow_listdir_iter
+    sftp.files['bc-2022-172_0002.jp2'] = 0o100664
+    connection.refresh()
+    assert seen == [['bc-2022-172_0001.jp2']]
+    assert connection.find_images('bc-2022-172') == ['bc-2022-172_0001.jp2', 'bc-2022-172_0002.jp2']
+
+
+def test_permissions_from_listing():
+    sftp = FakeSFTP({'bc-2022-172_0001.jp2': 0o100664, 'bc-2022-172_0002.jp2': 0o100600})
+    connection = FakeConnection(sftp, TransportProfile(retry_delay=0))
+    connection.fix_permissions(['bc-2022-172_0001.jp2', 'bc-2022-172_0002.jp2', 'bc-2022-172_0003.jp2'])
+    assert sftp.stats == 1
+    assert sftp.chmods == [('/images/bc-2022-172_0002.jp2', permissions)]
+
+
+def test_sharded_listing():
+    sftp = FakeSFTP({'bc-2022/bc-2022-172_0001.jp2': 0o100600, 'bc-2021/bc-2021-001_0001.jp2': 0o100664})
+    connection = FakeConnection(sftp, TransportProfile(retry_delay=0), Layout('prefix'))
+    assert connection.files == []
+    assert connection.list_images('bc-2022-172') == ['bc-2022/bc-2022-172_0001.jp2']
+    assert sftp.stats == 0
+    assert sftp.chmods == [('/images/bc-2022/bc-2022-172_0001.jp2', permissions)]
+    assert connection.list_images('bc-2023-001') == []
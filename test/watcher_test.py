@@ -0,0 +1,59 @@
+import time
+
+from manifester.local_directory import LocalDirectory
+from manifester.watcher import SequenceWatcher
+
+
+def test_ready_after_quiet_and_contiguous(image_source):
+    collected = []
+    ready = []
+    watcher = SequenceWatcher(image_source, ['bc-2022-172'], 0, collected.append,
+                              lambda image_base, files: ready.append((image_base, files)))
+
+    image_source.files = ['bc-2022-172_0001.jp2', 'bc-2022-172_0003.jp2']
+    assert watcher.poll() == []
+
+    image_source.files.append('bc-2022-172_0002.jp2')
+    assert watcher.poll() == ['bc-2022-172']
+    assert collected == ['bc-2022-172_0001.jp2', 'bc-2022-172_0003.jp2']
+    assert ready == [('bc-2022-172', ['bc-2022-172_0001.jp2', 'bc-2022-172_0002.jp2', 'bc-2022-172_0003.jp2'])]
+    assert watcher.pending == {}
+
+
+def test_waits_for_quiet_period(image_source):
+    image_source.files = ['bc-2022-172_0001.jp2']
+    watcher = SequenceWatcher(image_source, ['bc-2022-172'], 3600, lambda filename: None, lambda base, files: None)
+    watcher.poll()
+    assert watcher.poll() == []
+
+
+def test_waits_for_growing_file(tmp_path):
+    image = tmp_path / 'bc-2022-172_0001.jp2'
+    image.write_bytes(b'jp2')
+    source = LocalDirectory(str(tmp_path))
+    watcher = SequenceWatcher(source, ['bc-2022-172'], .2, lambda filename: None, lambda base, files: None)
+    assert watcher.poll() == []
+    time.sleep(.25)
+
+    # Still being uploaded: the name is unchanged, but the file has grown.
+    image.write_bytes(b'jp2 and more')
+    assert watcher.poll() == []
+    time.sleep(.25)
+    assert watcher.poll() == ['bc-2022-172']
+
+
+def test_failed_build_is_retried(image_source):
+    image_source.files = ['bc-2022-172_0001.jp2']
+    attempts = []
+
+    def build(image_base, files):
+        attempts.append(image_base)
+        if len(attempts) == 1:
+            raise Exception('IIIF server unavailable')
+
+    watcher = SequenceWatcher(image_source, ['bc-2022-172'], 0, lambda filename: None, build)
+    assert watcher.poll() == []
+    assert 'bc-2022-172' in watcher.pending
+    assert watcher.poll() == ['bc-2022-172']
+    assert attempts == ['bc-2022-172', 'bc-2022-172']
+    assert watcher.pending == {}